@@ -0,0 +1,262 @@
+"""
+Top-k 후보 RGB 비교 PNG 공용 코드 (s2_make_compare_png / s2_download_top3_and_compare).
+"""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
+from pathlib import Path
+
+import numpy as np
+import rasterio
+from PIL import Image, ImageDraw, ImageFont
+
+from s2_decode_cache import decode_cache_load, decode_cache_path, decode_cache_save
+
+
+# mild gamma to improve contrast (1024-entry LUT, pow 대신 gather)
+GAMMA = 1.15
+GAMMA_LUT_SIZE = 1024
+GAMMA_LUT = (np.linspace(0.0, 1.0, GAMMA_LUT_SIZE) ** (1.0 / GAMMA) * 255.0).astype(np.uint8)
+
+# percentile 추정용 서브샘플 크기 (시각화에는 충분히 정확)
+PCT_SAMPLE_SIZE = 200_000
+
+# compare PNG용 GDAL 설정 (JP2 decode 멀티스레드)
+# GDAL_CACHEMAX를 크게 잡으면 축소 읽기가 오히려 2-5배 느려져서 기본값 유지
+GDAL_ENV = {
+    "GDAL_NUM_THREADS": "ALL_CPUS",
+    "CPL_VSIL_CURL_ALLOWED_EXTENSIONS": ".jp2",
+}
+
+# band read용 공용 스레드풀 (GDAL/OpenJPEG decode 중에는 GIL이 풀림)
+BAND_POOL = ThreadPoolExecutor(max_workers=9, thread_name_prefix="jp2-read")
+
+# compare PNG 패널 사이 흰색 여백(px)
+PANEL_GAP = 8
+
+
+def _percentiles(v: np.ndarray, p_low: float, p_high: float) -> tuple[float, float]:
+    """1D 배열의 (p_low, p_high) 백분위 — np.partition(introselect)으로 O(N)."""
+    k_lo = int(round(p_low / 100.0 * (v.size - 1)))
+    k_hi = int(round(p_high / 100.0 * (v.size - 1)))
+    part = np.partition(v, [k_lo, k_hi])
+    return float(part[k_lo]), float(part[k_hi])
+
+
+def normalize_rgb_uint8(r: np.ndarray, g: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Sentinel-2 L2A reflectance is typically scaled ~0..10000 (int16/uint16).
+    Robust percentile stretch + mild gamma for visualization.
+    Output: HxWx3 uint8
+    """
+    return normalize_rgb_hwc_uint8(np.stack([r, g, b], axis=-1))
+
+
+def normalize_rgb_hwc_uint8(rgb: np.ndarray) -> np.ndarray:
+    """
+    Same as normalize_rgb_uint8, for an already interleaved HxWx3 array.
+    Integer inputs stay integer until the final stretch (float32 only there);
+    a float32 input is stretched in place.
+    """
+    valid = np.isfinite(rgb) & (rgb > 0)
+    if not np.any(valid):
+        rgb = np.clip(rgb, 0, 10000)
+        rgb = (rgb / 10000.0) * 255.0
+        return np.clip(rgb, 0, 255).astype(np.uint8)
+
+    # Percentile stretch: 서브샘플 + np.partition (O(N) select, 전체 정렬 없음)
+    flat = rgb.reshape(-1, 3)
+    n = flat.shape[0]
+    if n > PCT_SAMPLE_SIZE:
+        idx = np.random.default_rng(0).integers(0, n, PCT_SAMPLE_SIZE)  # 재현성을 위해 seed 고정
+        sample = flat[idx]
+    else:
+        sample = flat
+
+    lo = np.empty(3, dtype=np.float32)
+    hi = np.empty(3, dtype=np.float32)
+    for c in range(3):
+        v = sample[:, c]
+        v = v[np.isfinite(v) & (v > 0)]
+        if v.size < 100 and sample is not flat:
+            # 유효 픽셀이 드문 채널은 샘플 대신 전체에서
+            chan = flat[:, c]
+            v = chan[np.isfinite(chan) & (chan > 0)]
+        if v.size < 100:
+            vv = flat[:, c][np.isfinite(flat[:, c])]
+            lo[c], hi[c] = _percentiles(vv, 2, 98) if vv.size else (0.0, 1.0)
+        else:
+            lo[c], hi[c] = _percentiles(v, 2, 98)
+
+        if hi[c] <= lo[c]:
+            lo[c] = float(np.min(v)) if v.size else 0.0
+            hi[c] = float(np.max(v)) if v.size else 1.0
+            if hi[c] <= lo[c]:
+                hi[c] = lo[c] + 1.0
+
+    out = rgb.astype(np.float32, copy=False)
+    out -= lo
+    out /= hi - lo
+    np.clip(out, 0, 1, out=out)
+
+    # gamma: pow 대신 LUT 조회
+    idx = (out * (GAMMA_LUT_SIZE - 1) + 0.5).astype(np.uint16)
+    return GAMMA_LUT[idx]
+
+
+def _read_into(ds, out_shape: tuple[int, int], out: np.ndarray | None) -> np.ndarray:
+    # rasterio: out / out_shape는 동시에 줄 수 없음
+    kw = {"out": out} if out is not None else {"out_shape": out_shape}
+    return ds.read(1, resampling=rasterio.enums.Resampling.bilinear, **kw)
+
+
+def _decode_band_resampled(
+    path: Path,
+    out_shape: tuple[int, int] | None = None,
+    out: np.ndarray | None = None,
+    ds=None,
+) -> np.ndarray:
+    """
+    Read single-band JP2. Optionally resample to out_shape (H, W) using rasterio.
+    Downscaled reads decode from a reduced-resolution level (GDAL picks the overview).
+    If out is given (H x W view, same dtype as the file), data is read into it.
+    이미 열린 dataset(ds)을 넘기면 다시 열지 않음.
+    """
+    if out is not None:
+        out_shape = out.shape
+
+    # rasterio.Env는 스레드 로컬 -> worker 스레드에서도 적용되도록 여기서 설정
+    with rasterio.Env(**GDAL_ENV), ExitStack() as stack:
+        if ds is None:
+            ds = stack.enter_context(rasterio.open(path))
+        if out_shape is None:
+            return ds.read(1)
+        return _read_into(ds, out_shape, out)
+
+
+def read_band_resampled(
+    path: Path,
+    out_shape: tuple[int, int] | None = None,
+    out: np.ndarray | None = None,
+    ds=None,
+) -> np.ndarray:
+    """
+    Cached wrapper around _decode_band_resampled (see s2_decode_cache).
+    If out is given (H x W view, same dtype as the file), data is read into it.
+    """
+    if out is not None:
+        out_shape = out.shape
+
+    cache_path = decode_cache_path(path, out_shape, "bilinear")
+    arr = decode_cache_load(cache_path, out=out)
+    if arr is None:
+        arr = _decode_band_resampled(path, out_shape=out_shape, out=out, ds=ds)
+        decode_cache_save(cache_path, arr)
+    return arr
+
+
+def _load_panel(cand: dict, max_side: int) -> np.ndarray:
+    paths = cand["paths"]
+
+    r_path = paths["B04"]
+    g_path = paths["B03"]
+    b_path = paths["B02"]
+
+    # B04를 한 번만 열어서 크기/dtype도 얻고 R decode에도 그대로 사용
+    with rasterio.Env(**GDAL_ENV), rasterio.open(r_path) as rds:
+        H, W = rds.height, rds.width
+
+        scale = 1.0
+        if max(H, W) > max_side:
+            scale = max_side / float(max(H, W))
+        out_shape = (max(1, int(H * scale)), max(1, int(W * scale)))
+
+        # R/G/B를 HxWx3 버퍼의 각 채널에 직접 동시 decode (np.stack 복사 없음)
+        rgb = np.empty(out_shape + (3,), dtype=rds.dtypes[0])
+        list(BAND_POOL.map(
+            lambda c, path, ds: read_band_resampled(path, out=rgb[..., c], ds=ds),
+            range(3), [r_path, g_path, b_path], [rds, None, None],
+        ))
+
+    return normalize_rgb_hwc_uint8(rgb)
+
+
+def _load_font(size: int):
+    try:
+        return ImageFont.load_default(size=size)  # Pillow >= 10.1
+    except TypeError:
+        return ImageFont.load_default()
+
+
+def save_panels_png(out_png: Path, panels: list[np.ndarray], subtitles: list[str], title: str) -> None:
+    """
+    HxWx3 uint8 패널을 가로로 이어 붙이고(흰색 구분선) 제목/부제목은 PIL로 그림.
+    matplotlib figure/Agg 렌더링 없이 바로 PNG로 저장.
+    """
+    gap = PANEL_GAP
+    font_title = _load_font(32)
+    font_sub = _load_font(20)
+
+    probe = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+
+    def text_size(text: str, font) -> tuple[int, int]:
+        x0, y0, x1, y1 = probe.multiline_textbbox((0, 0), text, font=font, align="center")
+        return x1 - x0, y1 - y0
+
+    title_h = text_size(title, font_title)[1] + 2 * gap
+    sub_h = max(text_size(s, font_sub)[1] for s in subtitles) + 2 * gap
+
+    widths = [p.shape[1] for p in panels]
+    panel_h = max(p.shape[0] for p in panels)
+    W = sum(widths) + gap * (len(panels) + 1)
+    H = title_h + sub_h + panel_h + gap
+
+    canvas = np.full((H, W, 3), 255, dtype=np.uint8)
+    x = gap
+    for p, w in zip(panels, widths):
+        canvas[title_h + sub_h:title_h + sub_h + p.shape[0], x:x + w] = p
+        x += w + gap
+
+    img = Image.fromarray(canvas)
+    draw = ImageDraw.Draw(img)
+
+    tw, _ = text_size(title, font_title)
+    draw.text(((W - tw) // 2, gap), title, fill="black", font=font_title)
+
+    x = gap
+    for sub, w in zip(subtitles, widths):
+        sw, _ = text_size(sub, font_sub)
+        draw.multiline_text((x + (w - sw) // 2, title_h + gap), sub, fill="black", font=font_sub, align="center")
+        x += w + gap
+
+    out_png.parent.mkdir(parents=True, exist_ok=True)
+    img.save(out_png, compress_level=1)
+
+
+def make_triplet_compare_png(
+    triplet: list[dict],
+    out_png: Path,
+    title: str,
+    max_side: int = 1400,
+) -> None:
+    """
+    triplet: list of dicts (보통 3개), each includes:
+      - id
+      - datetime
+      - eo:cloud_cover
+      - paths: {"B02": Path, "B03": Path, "B04": Path}
+    """
+    # 후보끼리도 겹쳐서 처리 (한 후보를 normalize하는 동안 다른 후보 decode)
+    panels = [None] * len(triplet)
+    with ThreadPoolExecutor(max_workers=max(1, len(triplet))) as ex:
+        futs = {ex.submit(_load_panel, cand, max_side): i for i, cand in enumerate(triplet)}
+        for fut in as_completed(futs):
+            panels[futs[fut]] = fut.result()
+
+    subtitles = [
+        f"{cand['id']}\n{cand.get('datetime')} | cloud={cand.get('eo:cloud_cover')}"
+        for cand in triplet
+    ]
+
+    save_panels_png(out_png, panels, subtitles, title)
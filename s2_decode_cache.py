@@ -0,0 +1,92 @@
+"""
+JP2 decode 결과 디스크 캐시 (s2_make_indices / s2_make_compare_png / s2_download_top3_and_compare 공용).
+
+- key: 원본 경로, mtime, 크기, out_shape, resampling, dtype -> 재다운로드되면 자동 무효화
+- 무압축 .npy로 저장 (deflate 압축은 decode만큼 느릴 수 있음) -> mmap_mode="r"로 바로 읽을 수 있음
+- 폴더 전체 크기가 DECODE_CACHE_MAX_BYTES를 넘으면 오래 안 쓴 파일부터 삭제
+- downloads/.decode_cache 폴더는 언제 지워도 됨 (다음 실행 때 다시 decode)
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+DECODE_CACHE_DIR = Path("downloads") / ".decode_cache"
+
+# 캐시 폴더 크기 상한 (기본 20 GB, S2_DECODE_CACHE_MAX_GB로 조정 / 0이면 캐시 사용 안 함)
+DECODE_CACHE_MAX_BYTES = int(float(os.environ.get("S2_DECODE_CACHE_MAX_GB", "20")) * 1024**3)
+
+_PRUNE_LOCK = threading.Lock()
+
+
+def decode_cache_path(path: Path, out_shape, resampling_name: str, dtype=None) -> Path:
+    st = path.stat()
+    key = f"{path.resolve()}|{st.st_mtime_ns}|{st.st_size}|{out_shape}|{resampling_name}"
+    if dtype is not None:
+        key += f"|{np.dtype(dtype).name}"
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    return DECODE_CACHE_DIR / f"{path.stem}_{digest}.npy"
+
+
+def decode_cache_load(cache_path: Path, out: np.ndarray | None = None) -> np.ndarray | None:
+    """
+    캐시가 있으면 배열을 반환, 없거나 깨졌으면 None.
+    out이 주어지면 mmap으로 열어 out에 바로 채움 (전체 크기의 임시 배열을 만들지 않음).
+    """
+    if DECODE_CACHE_MAX_BYTES <= 0 or not cache_path.exists():
+        return None
+    try:
+        if out is None:
+            arr = np.load(cache_path, allow_pickle=False)
+        else:
+            mm = np.load(cache_path, mmap_mode="r", allow_pickle=False)
+            if mm.shape != out.shape:
+                return None
+            out[...] = mm
+            del mm  # Windows: 매핑을 풀어야 나중에 prune/replace 가능
+            arr = out
+    except (OSError, ValueError):
+        return None  # 깨진 캐시는 무시하고 다시 decode
+    try:
+        os.utime(cache_path)  # mtime = 마지막 사용 시각 (prune 순서 기준)
+    except OSError:
+        pass
+    return arr
+
+
+def decode_cache_save(cache_path: Path, arr: np.ndarray) -> None:
+    if DECODE_CACHE_MAX_BYTES <= 0 or arr.nbytes > DECODE_CACHE_MAX_BYTES:
+        return
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_name(f"{cache_path.stem}.{threading.get_ident()}.tmp.npy")
+    np.save(tmp_path, arr, allow_pickle=False)
+    tmp_path.replace(cache_path)
+    decode_cache_prune()
+
+
+def decode_cache_prune(max_bytes: int = DECODE_CACHE_MAX_BYTES) -> None:
+    """캐시 폴더가 max_bytes 이하가 될 때까지 오래 안 쓴(mtime) 파일부터 삭제."""
+    with _PRUNE_LOCK:
+        try:
+            with os.scandir(DECODE_CACHE_DIR) as it:
+                entries = [
+                    (st.st_mtime_ns, st.st_size, e.path)
+                    for e in it
+                    if e.is_file() and e.name.endswith(".npy") and ".tmp." not in e.name
+                    for st in (e.stat(),)
+                ]
+        except FileNotFoundError:
+            return
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.unlink(p)
+            except OSError:
+                continue  # 다른 프로세스가 사용 중(Windows) -> 다음 파일
+            total -= size
@@ -2,12 +2,23 @@ import os
 import sys
 import json
 import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from pathlib import Path
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
+try:
+    from requests_cache import CachedSession, DO_NOT_CACHE
+except ImportError:  # requests-cache는 선택 사항 -> 캐시 없이 동작
+    CachedSession = None
+
 
 # ----------------------------
 # Config
@@ -17,44 +28,167 @@ TOKEN_URL = "https://identity.dataspace.copernicus.eu/auth/realms/CDSE/protocol/
 ODATA_ZIPPER_TEMPLATE = "https://zipper.dataspace.copernicus.eu/odata/v1/Products({product_id})/$value"
 ODATA_SEARCH_URL = "https://catalogue.dataspace.copernicus.eu/odata/v1/Products"
 
-def odata_get_uuid_by_name(product_name_no_safe: str, token: str) -> str:
+# Zipper 다운로드: Range 요청을 여러 연결로 나눠 받음 (단일 TCP 스트림 한계 회피)
+RANGE_PART_SIZE = 64 * 1024 * 1024
+RANGE_WORKERS = 8
+
+# OData Name 일괄 조회 시 한 요청에 넣을 이름 수 (URL 길이 제한 고려)
+ODATA_BATCH_SIZE = 20
+
+# 진행률 출력 간격(초) — 최대 10 Hz
+PROGRESS_INTERVAL = 0.1
+
+# 액세스 토큰 캐시 (실행 간 재사용, 만료 60초 전부터 refresh_token으로 갱신)
+TOKEN_CACHE_PATH = Path("~/.cache/s2dl/token.json").expanduser()
+TOKEN_EXPIRY_MARGIN = 60
+
+# STAC/OData 조회 결과 디스크 캐시 (같은 질의 반복 시 네트워크 생략)
+# 토큰 발급과 Zipper 다운로드는 캐시하지 않음
+HTTP_CACHE_NAME = ".s2_cache"
+HTTP_CACHE_EXPIRE = timedelta(hours=6)
+
+# 공용 세션: keep-alive/TLS 재사용 + 429/5xx 재시도(Retry-After 존중)
+if CachedSession is not None:
+    SESSION = CachedSession(
+        cache_name=HTTP_CACHE_NAME,
+        backend="sqlite",
+        expire_after=HTTP_CACHE_EXPIRE,
+        allowable_methods=("GET", "POST"),
+        allowable_codes=(200,),
+        match_headers=False,
+        urls_expire_after={
+            "identity.dataspace.copernicus.eu": DO_NOT_CACHE,
+            "zipper.dataspace.copernicus.eu": DO_NOT_CACHE,
+        },
+    )
+else:
+    SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=16,
+    max_retries=Retry(
+        total=5,
+        backoff_factor=1,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=frozenset({"GET", "HEAD", "POST"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    ),
+)
+SESSION.mount("http://", _ADAPTER)
+SESSION.mount("https://", _ADAPTER)
+SESSION.headers.update({"User-Agent": "sentinel2-dl/1.0"})
+
+def _safe_name(product_name: str) -> str:
     # OData의 Name은 보통 ".SAFE" 포함 형태로 조회하는 게 안정적입니다.
-    name = product_name_no_safe if product_name_no_safe.endswith(".SAFE") else product_name_no_safe + ".SAFE"
+    return product_name if product_name.endswith(".SAFE") else product_name + ".SAFE"
 
-    # filter에서 작은따옴표 이스케이프
-    name_escaped = name.replace("'", "''")
 
-    params = {
-        "$filter": f"Name eq '{name_escaped}'",
-        "$select": "Id,Name",
-        "$top": "1",
-    }
+def odata_get_uuids(product_names: List[str], token: str) -> Dict[str, str]:
+    """
+    Batch Name -> UUID lookup: "Name eq 'A' or Name eq 'B' ..." 한 번의 요청으로 조회.
+    Returns {name_without_.SAFE: uuid}. 조회되지 않은 이름은 결과에 없음.
+    URL 길이 제한(~2 KB) 때문에 ODATA_BATCH_SIZE개씩 나눠서 요청합니다.
+    """
+    names = list(dict.fromkeys(_safe_name(n) for n in product_names))
 
     # 검색은 토큰 없이 되는 경우도 있지만, 토큰을 붙이면 권한/정책 변화에도 안전합니다.
     headers = {"Authorization": f"Bearer {token}"}
 
-    r = requests.get(ODATA_SEARCH_URL, params=params, headers=headers, timeout=60)
-    if not r.ok:
-        raise RuntimeError(f"OData lookup failed {r.status_code}: {r.text}")
+    out: Dict[str, str] = {}
+    for i in range(0, len(names), ODATA_BATCH_SIZE):
+        batch = names[i:i + ODATA_BATCH_SIZE]
 
-    js = r.json()
-    values = js.get("value", [])
-    if not values:
+        # filter에서 작은따옴표 이스케이프
+        escaped = [n.replace("'", "''") for n in batch]
+        params = {
+            "$filter": " or ".join(f"Name eq '{n}'" for n in escaped),
+            "$select": "Id,Name",
+            "$top": str(len(batch)),
+        }
+
+        r = SESSION.get(ODATA_SEARCH_URL, params=params, headers=headers, timeout=60)
+        if not r.ok:
+            raise RuntimeError(f"OData lookup failed {r.status_code}: {r.text}")
+
+        for v in r.json().get("value", []):
+            out.setdefault(v["Name"].removesuffix(".SAFE"), v["Id"])  # UUID
+
+    return out
+
+
+def odata_get_uuid_by_name(product_name_no_safe: str, token: str) -> str:
+    name = _safe_name(product_name_no_safe)
+    uuids = odata_get_uuids([name], token)
+    key = name.removesuffix(".SAFE")
+    if key not in uuids:
         raise RuntimeError(f"OData returned 0 items for Name='{name}'. (Name이 다르거나 제품이 비활성/미러링 상태일 수 있음)")
 
-    return values[0]["Id"]  # UUID
+    return uuids[key]
+
+
+def _load_token_cache(username: str) -> Optional[Dict[str, Any]]:
+    try:
+        tok = json.loads(TOKEN_CACHE_PATH.read_text())
+    except (OSError, ValueError):
+        return None
+    if tok.get("username") != username:
+        return None
+    return tok
+
+
+def _save_token_cache(username: str, js: Dict[str, Any], t0: float) -> None:
+    tok = {
+        "username": username,
+        "access_token": js["access_token"],
+        "exp": t0 + float(js.get("expires_in", 0)),
+        "refresh_token": js.get("refresh_token"),
+        "refresh_exp": t0 + float(js.get("refresh_expires_in", 0)),
+    }
+    TOKEN_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = TOKEN_CACHE_PATH.with_suffix(".tmp")
+    # 처음부터 0600으로 생성 (권한 변경 전 잠깐이라도 노출되지 않도록)
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump(tok, f)
+    os.chmod(tmp, 0o600)
+    os.replace(tmp, TOKEN_CACHE_PATH)
+
 
 def get_access_token(username: str, password: str) -> str:
+    """
+    캐시된 토큰이 만료 TOKEN_EXPIRY_MARGIN초 전까지 유효하면 재사용,
+    아니면 refresh_token grant -> 실패 시 password grant 순으로 새로 발급.
+    """
+    now = time.time()
+    tok = _load_token_cache(username)
+    if tok is not None:
+        if tok.get("exp", 0) > now + TOKEN_EXPIRY_MARGIN:
+            return tok["access_token"]
+        if tok.get("refresh_token") and tok.get("refresh_exp", 0) > now + TOKEN_EXPIRY_MARGIN:
+            data = {
+                "client_id": "cdse-public",
+                "grant_type": "refresh_token",
+                "refresh_token": tok["refresh_token"],
+            }
+            r = SESSION.post(TOKEN_URL, data=data, timeout=60)
+            if r.ok:
+                js = r.json()
+                _save_token_cache(username, js, now)
+                return js["access_token"]
+            # refresh 실패(세션 만료/폐기 등) -> password grant로 진행
+
     data = {
         "client_id": "cdse-public",
         "grant_type": "password",
         "username": username,
         "password": password,
     }
-    r = requests.post(TOKEN_URL, data=data, timeout=60)
+    r = SESSION.post(TOKEN_URL, data=data, timeout=60)
     if not r.ok:
         raise RuntimeError(f"Token request failed {r.status_code}: {r.text}")
     js = r.json()
+    _save_token_cache(username, js, now)
     return js["access_token"]
 
 
@@ -65,7 +199,7 @@ def stac_search(bbox: list, datetime_range: str, collection: str, limit: int = 5
         "datetime": datetime_range,
         "limit": limit,
     }
-    r = requests.post(STAC_SEARCH_URL, json=query, timeout=60)
+    r = SESSION.post(STAC_SEARCH_URL, json=query, timeout=60)
     if not r.ok:
         # print error body for diagnostics
         raise RuntimeError(f"STAC search failed {r.status_code}: {r.text}")
@@ -84,54 +218,199 @@ def pick_first_item(fc: Dict[str, Any]) -> Tuple[str, str]:
     return item_id, dt
 
 
+def _probe_size(session: requests.Session, url: str, headers: Dict[str, str]) -> Tuple[int, bool]:
+    """
+    Return (total_bytes, supports_range).
+    "Range: bytes=0-0" GET으로 크기를 확인 -> 206이면 Range 지원, 200이면 미지원.
+    """
+    with session.get(url, headers={**headers, "Range": "bytes=0-0"}, stream=True, timeout=60) as r:
+        if not r.ok:
+            raise RuntimeError(f"Download failed {r.status_code}: {r.text[:500]}")
+        if r.status_code == 206:
+            # Content-Range: bytes 0-0/123456
+            total = r.headers.get("Content-Range", "").rpartition("/")[2]
+            if total.isdigit():
+                return int(total), True
+        return int(r.headers.get("Content-Length", "0") or "0"), False
+
+
+def _retry(fn, max_retries: int, label: str):
+    for attempt in range(1, max_retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            print(f"\n⚠️ {label}: attempt {attempt}/{max_retries} failed: {e}")
+            if attempt < max_retries:
+                time.sleep(2 * attempt)
+            else:
+                raise
+
+
+class _Progress:
+    """
+    스레드 간 공유되는 다운로드 진행률.
+    worker는 카운터만 올리고, 출력은 reporter 스레드 하나가 최대 1/interval Hz로 함
+    (청크마다 stdout write+flush 하지 않음).
+    """
+
+    def __init__(self, total: int, interval: float = PROGRESS_INTERVAL) -> None:
+        self.total = total
+        self.written = 0
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def add(self, n: int) -> None:
+        with self._lock:
+            self.written += n
+
+    def _print(self) -> None:
+        if self.total <= 0:
+            return
+        with self._lock:
+            written = self.written
+        pct = (written / self.total) * 100
+        sys.stdout.write(f"\rDownloading... {pct:6.2f}% ({written}/{self.total} bytes)")
+        sys.stdout.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._print()
+
+    def __enter__(self) -> "_Progress":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._print()
+
+
+def _download_single(
+    session: requests.Session,
+    url: str,
+    headers: Dict[str, str],
+    tmp_path: Path,
+    chunk_size: int,
+    max_retries: int,
+) -> None:
+    def fetch() -> None:
+        with session.get(url, headers=headers, stream=True, timeout=300) as r:
+            if not r.ok:
+                raise RuntimeError(f"Download failed {r.status_code}: {r.text[:500]}")
+
+            total = int(r.headers.get("Content-Length", "0") or "0")
+            written = 0
+            # 시도마다 .part를 새로 씀 ("wb" -> 이전 시도의 부분 파일은 잘라냄)
+            with _Progress(total) as progress, open(tmp_path, "wb") as f:
+                for chunk in r.iter_content(chunk_size=chunk_size):
+                    if not chunk:
+                        continue
+                    f.write(chunk)
+                    written += len(chunk)
+                    progress.add(len(chunk))
+            if total and written != total:
+                raise RuntimeError(f"Short read: got {written}/{total} bytes")
+
+    # 스트림 도중 끊기면 처음부터 다시 받음 (Retry는 본문 읽기 실패까지는 다시 시도하지 않음)
+    _retry(fetch, max_retries, "download")
+
+
+def _download_ranges(
+    session: requests.Session,
+    url: str,
+    headers: Dict[str, str],
+    tmp_path: Path,
+    total: int,
+    chunk_size: int,
+    part_size: int,
+    max_workers: int,
+    max_retries: int,
+) -> None:
+    # 전체 크기로 미리 할당해두고 각 구간을 제자리에 씀
+    with open(tmp_path, "wb") as f:
+        f.truncate(total)
+
+    ranges: List[Tuple[int, int]] = [
+        (lo, min(lo + part_size, total) - 1) for lo in range(0, total, part_size)
+    ]
+
+    def fetch_range(lo: int, hi: int) -> None:
+        h = {**headers, "Range": f"bytes={lo}-{hi}"}
+        with session.get(url, headers=h, stream=True, timeout=300) as r:
+            if r.status_code != 206:
+                raise RuntimeError(f"Range request failed {r.status_code}: {r.text[:500]}")
+            pos = lo
+            try:
+                with open(tmp_path, "r+b") as f:
+                    f.seek(lo)
+                    for chunk in r.iter_content(chunk_size=chunk_size):
+                        if not chunk:
+                            continue
+                        f.write(chunk)
+                        pos += len(chunk)
+                        progress.add(len(chunk))
+                if pos != hi + 1:
+                    raise RuntimeError(f"Short read for bytes={lo}-{hi}: got {pos - lo} bytes")
+            except Exception:
+                progress.add(lo - pos)  # 재시도 시 중복 집계되지 않도록 되돌림
+                raise
+
+    # 구간 단위 재시도: 스트림 도중 끊기거나 짧게 받은 구간만 다시 받음
+    # (Retry는 응답 본문 읽기 실패까지는 다시 시도하지 않음)
+    with _Progress(total) as progress, ThreadPoolExecutor(max_workers=max_workers) as ex:
+        futs = [
+            ex.submit(_retry, lambda lo=lo, hi=hi: fetch_range(lo, hi), max_retries, f"bytes={lo}-{hi}")
+            for lo, hi in ranges
+        ]
+        for fut in futs:
+            fut.result()
+
+
 def download_with_token(
     product_id: str,
     token: str,
     out_zip: Path,
     chunk_size: int = 1024 * 1024,
     max_retries: int = 3,
+    part_size: int = RANGE_PART_SIZE,
+    max_workers: int = RANGE_WORKERS,
 ) -> None:
     url = ODATA_ZIPPER_TEMPLATE.format(product_id=product_id)
     headers = {"Authorization": f"Bearer {token}"}
 
     out_zip.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_zip.with_suffix(out_zip.suffix + ".part")
 
-    for attempt in range(1, max_retries + 1):
-        try:
-            with requests.get(url, headers=headers, stream=True, timeout=300) as r:
-                if not r.ok:
-                    raise RuntimeError(f"Download failed {r.status_code}: {r.text[:500]}")
+    # 연결/상태코드 재시도는 SESSION의 Retry가 처리
+    total, ranged = _probe_size(SESSION, url, headers)
 
-                total = int(r.headers.get("Content-Length", "0") or "0")
-                written = 0
+    if ranged and total > part_size:
+        _download_ranges(
+            SESSION, url, headers, tmp_path, total,
+            chunk_size=chunk_size, part_size=part_size,
+            max_workers=max_workers, max_retries=max_retries,
+        )
+    else:
+        # 서버가 Range를 지원하지 않으면(200) 기존 단일 스트림으로
+        _download_single(SESSION, url, headers, tmp_path, chunk_size, max_retries=max_retries)
 
-                tmp_path = out_zip.with_suffix(out_zip.suffix + ".part")
-                with open(tmp_path, "wb") as f:
-                    for chunk in r.iter_content(chunk_size=chunk_size):
-                        if not chunk:
-                            continue
-                        f.write(chunk)
-                        written += len(chunk)
-                        if total > 0:
-                            pct = (written / total) * 100
-                            sys.stdout.write(f"\rDownloading... {pct:6.2f}% ({written}/{total} bytes)")
-                            sys.stdout.flush()
-
-                # move into place
-                tmp_path.replace(out_zip)
-                sys.stdout.write("\n")
-                print(f"✅ Saved: {out_zip}")
-                return
-
-        except Exception as e:
-            print(f"\n⚠️ Attempt {attempt}/{max_retries} failed: {e}")
-            if attempt < max_retries:
-                time.sleep(2 * attempt)
-            else:
-                raise
+    # move into place
+    tmp_path.replace(out_zip)
+    sys.stdout.write("\n")
+    print(f"✅ Saved: {out_zip}")
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--no-cache", action="store_true", help="clear the STAC/OData HTTP cache before running")
+    args = parser.parse_args()
+
+    if args.no_cache and CachedSession is not None:
+        SESSION.cache.clear()
+
     load_dotenv()
 
     # ---- user inputs (edit here or pass as env/args) ----
@@ -1,22 +1,50 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from urllib.parse import urlparse
 from datetime import datetime, timezone
 
-import numpy as np
-import rasterio
-import matplotlib.pyplot as plt
-
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError, IncompleteReadError
 from dotenv import load_dotenv
 
+# compare PNG 코드는 s2_make_compare_png와 공유 (read_jp2_band / normalize_rgb_uint8 이름도 유지)
+from s2_compare_common import make_triplet_compare_png, normalize_rgb_uint8, read_band_resampled as read_jp2_band
+
+try:
+    import aiofiles
+    import aiohttp
+    from aiobotocore.session import get_session
+    HAVE_AIO = True
+except ImportError:  # aiobotocore/aiofiles는 선택 사항 (S2_DOWNLOAD_BACKEND=async일 때만 사용)
+    HAVE_AIO = False
+
 
 EODATA_ENDPOINT = "https://eodata.dataspace.copernicus.eu"
 
+# 밴드 단위 병렬 다운로드 (S3 GET은 RTT-bound라 스레드로 겹쳐서 받음)
+DOWNLOAD_WORKERS = 16
+TRANSFER_CONFIG = TransferConfig(
+    max_concurrency=8,
+    use_threads=True,
+    multipart_threshold=8 * 1024 * 1024,
+)
+
+# 다운로드 backend: "threads"(boto3 + 스레드풀, 기본) 또는 "async"(aiobotocore, 선택 설치)
+DOWNLOAD_BACKEND = os.environ.get("S2_DOWNLOAD_BACKEND", "threads").lower()
+
+# asyncio 다운로드: 동시 요청 수 제한(CDSE quota) + 429/503 및 연결/스트림 오류 재시도
+ASYNC_CONCURRENCY = 8
+ASYNC_MAX_RETRIES = 5
+ASYNC_CHUNK = 1024 * 1024
+
 
 def parse_s3_href(href: str) -> tuple[str, str]:
     u = urlparse(href)
@@ -32,65 +60,6 @@ def dt_from_isoz(s: str) -> datetime:
     return datetime.fromisoformat(s).astimezone(timezone.utc)
 
 
-def normalize_rgb_uint8(r: np.ndarray, g: np.ndarray, b: np.ndarray) -> np.ndarray:
-    """
-    Sentinel-2 L2A reflectance is typically scaled ~0..10000 (int16/uint16).
-    We do a robust stretch using percentiles to get nice visualization.
-    Output: HxWx3 uint8
-    """
-    rgb = np.stack([r, g, b], axis=-1).astype(np.float32)
-
-    # Handle nodata/zeros robustly
-    valid = np.isfinite(rgb) & (rgb > 0)
-    if not np.any(valid):
-        # fallback
-        rgb = np.clip(rgb, 0, 10000)
-        rgb = (rgb / 10000.0) * 255.0
-        return np.clip(rgb, 0, 255).astype(np.uint8)
-
-    # Percentile stretch per-channel
-    out = np.zeros_like(rgb, dtype=np.float32)
-    for c in range(3):
-        chan = rgb[..., c]
-        v = chan[np.isfinite(chan) & (chan > 0)]
-        if v.size < 100:
-            lo, hi = np.percentile(chan[np.isfinite(chan)], [2, 98])
-        else:
-            lo, hi = np.percentile(v, [2, 98])
-
-        if hi <= lo:
-            lo, hi = float(np.min(v)), float(np.max(v) if v.size else 1.0)
-            if hi <= lo:
-                hi = lo + 1.0
-
-        chan = (chan - lo) / (hi - lo)
-        out[..., c] = np.clip(chan, 0, 1)
-
-    # mild gamma to improve contrast
-    gamma = 1.15
-    out = np.power(out, 1.0 / gamma)
-
-    return (out * 255.0).astype(np.uint8)
-
-
-def read_jp2_band(path: Path, out_shape: tuple[int, int] | None = None) -> np.ndarray:
-    """
-    Read single-band JP2. Optionally resample to out_shape (H, W) using rasterio.
-    """
-    with rasterio.open(path) as ds:
-        if out_shape is None:
-            arr = ds.read(1)
-            return arr
-        else:
-            h, w = out_shape
-            arr = ds.read(
-                1,
-                out_shape=(h, w),
-                resampling=rasterio.enums.Resampling.bilinear,
-            )
-            return arr
-
-
 def ensure_download(s3, href: str, out_path: Path) -> None:
     bucket, key = parse_s3_href(href)
     out_path.parent.mkdir(parents=True, exist_ok=True)
@@ -98,66 +67,125 @@ def ensure_download(s3, href: str, out_path: Path) -> None:
     if out_path.exists() and out_path.stat().st_size > 0:
         return
 
-    s3.download_file(bucket, key, str(out_path))
+    s3.download_file(bucket, key, str(out_path), Config=TRANSFER_CONFIG)
 
 
-def make_triplet_compare_png(
-    triplet: list[dict],
-    out_png: Path,
-    title: str,
-    max_side: int = 1400,
-) -> None:
+def _is_downloaded(p: Path) -> bool:
+    return p.exists() and p.stat().st_size > 0
+
+
+def dedupe_jobs(jobs: list[tuple[str, Path]]) -> tuple[list[tuple[str, Path]], list[tuple[Path, Path]]]:
     """
-    triplet: list of 3 dicts, each includes:
-      - id
-      - datetime
-      - eo:cloud_cover
-      - paths: {"B02": Path, "B03": Path, "B04": Path}
+    같은 S3 객체(bucket, key)가 여러 target/후보에 겹치면 한 번만 받도록 정리.
+    Returns (unique_jobs, links): links는 (canonical_path, other_path) — 다운로드 후 hardlink/copy.
+    이미 받아둔 경로가 있으면 그것을 canonical로 사용.
     """
-    panels = []
-    subtitles = []
+    canonical: dict[tuple[str, str], tuple[str, Path]] = {}
+    others: dict[tuple[str, str], list[Path]] = {}
+    for href, p in jobs:
+        k = parse_s3_href(href)
+        if k not in canonical:
+            canonical[k] = (href, p)
+            others[k] = []
+            continue
+        first = canonical[k][1]
+        if p == first or p in others[k]:
+            continue
+        if not _is_downloaded(first) and _is_downloaded(p):
+            canonical[k] = (href, p)
+            p, first = first, p
+        others[k].append(p)
 
-    for cand in triplet:
-        p = cand["paths"]
+    unique = list(canonical.values())
+    links = [(canonical[k][1], p) for k, ps in others.items() for p in ps]
+    return unique, links
 
-        # Read bands; resample all to same shape (use B04 as reference)
-        r_path = p["B04"]
-        g_path = p["B03"]
-        b_path = p["B02"]
 
-        with rasterio.open(r_path) as rds:
-            H, W = rds.height, rds.width
+def link_or_copy(src: Path, dst: Path) -> None:
+    if _is_downloaded(dst):
+        return
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(src, dst)
+    except OSError:  # 다른 드라이브/파일시스템 등 hardlink 불가
+        shutil.copy2(src, dst)
 
-        # Downscale if too large (keep aspect)
-        scale = 1.0
-        if max(H, W) > max_side:
-            scale = max_side / float(max(H, W))
-        out_shape = (int(H * scale), int(W * scale))
 
-        r = read_jp2_band(r_path, out_shape=out_shape)
-        g = read_jp2_band(g_path, out_shape=out_shape)
-        b = read_jp2_band(b_path, out_shape=out_shape)
+def download_all(s3, jobs: list[tuple[str, Path]], max_workers: int = DOWNLOAD_WORKERS) -> None:
+    """
+    jobs: [(href, out_path), ...]
+    이미 받은 파일은 제출 전에 건너뛰고, 나머지는 스레드풀로 동시에 받습니다.
+    (boto3 client는 download_file 호출에 대해 thread-safe이므로 하나를 공유)
+    """
+    pending = [(href, p) for href, p in jobs if not _is_downloaded(p)]
+    if not pending:
+        return
 
-        rgb8 = normalize_rgb_uint8(r, g, b)
-        panels.append(rgb8)
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        futs = {ex.submit(ensure_download, s3, href, p): p for href, p in pending}
+        for fut in as_completed(futs):
+            fut.result()  # 실패 시 예외를 그대로 올림
+            print(f"  downloaded -> {futs[fut]}")
 
-        subtitles.append(
-            f"{cand['id']}\n{cand['datetime']} | cloud={cand['eo:cloud_cover']}"
-        )
 
-    # Plot 1x3
-    plt.figure(figsize=(18, 6))
-    for i in range(3):
-        ax = plt.subplot(1, 3, i + 1)
-        ax.imshow(panels[i])
-        ax.set_title(subtitles[i], fontsize=9)
-        ax.axis("off")
+# GET 도중/본문 스트림 읽기 중 끊긴 경우 (ClientError 429/503과 같은 backoff로 재시도)
+if HAVE_AIO:
+    _AIO_RETRYABLE = (
+        HTTPClientError, BotoConnectionError, IncompleteReadError,
+        aiohttp.ClientError, asyncio.TimeoutError, ConnectionError,
+    )
+
 
-    plt.suptitle(title, fontsize=14)
-    out_png.parent.mkdir(parents=True, exist_ok=True)
-    plt.tight_layout(rect=[0, 0, 1, 0.95])
-    plt.savefig(out_png, dpi=200)
-    plt.close()
+async def _aio_fetch(s3, sem: asyncio.Semaphore, href: str, out_path: Path) -> None:
+    bucket, key = parse_s3_href(href)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_suffix(out_path.suffix + ".part")
+
+    async with sem:
+        for attempt in range(1, ASYNC_MAX_RETRIES + 1):
+            try:
+                resp = await s3.get_object(Bucket=bucket, Key=key)
+                async with resp["Body"] as stream, aiofiles.open(tmp_path, "wb") as f:
+                    while chunk := await stream.read(ASYNC_CHUNK):
+                        await f.write(chunk)
+                break
+            except ClientError as e:
+                status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+                if status not in (429, 503) or attempt == ASYNC_MAX_RETRIES:
+                    raise
+            except _AIO_RETRYABLE:
+                # 연결 끊김/본문 읽기 도중 오류: 다음 시도에서 .part를 처음부터 다시 씀
+                if attempt == ASYNC_MAX_RETRIES:
+                    raise
+            await asyncio.sleep(2 ** attempt)
+
+    tmp_path.replace(out_path)
+    print(f"  downloaded -> {out_path}")
+
+
+async def download_all_async(
+    jobs: list[tuple[str, Path]],
+    access_key: str,
+    secret_key: str,
+    concurrency: int = ASYNC_CONCURRENCY,
+) -> None:
+    """
+    download_all의 asyncio 버전: 이벤트 루프 하나에서 GET들을 겹쳐 보냄 (aiobotocore, SigV4).
+    """
+    pending = [(href, p) for href, p in jobs if not _is_downloaded(p)]
+    if not pending:
+        return
+
+    sem = asyncio.Semaphore(concurrency)
+    session = get_session()
+    async with session.create_client(
+        "s3",
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+        endpoint_url=EODATA_ENDPOINT,
+        config=Config(signature_version="s3v4", max_pool_connections=concurrency),
+    ) as s3:
+        await asyncio.gather(*(_aio_fetch(s3, sem, href, p) for href, p in pending))
 
 
 def main():
@@ -167,14 +195,6 @@ def main():
     access_key = os.environ["CDSE_S3_ACCESS_KEY"]
     secret_key = os.environ["CDSE_S3_SECRET_KEY"]
 
-    s3 = boto3.client(
-        "s3",
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret_key,
-        endpoint_url=EODATA_ENDPOINT,
-        config=Config(signature_version="s3v4"),
-    )
-
     # Manifest must include top-3 assets per target
     manifest_path = Path("downloads") / "s2_stac_picks_manifest.json"
     if not manifest_path.exists():
@@ -188,6 +208,9 @@ def main():
     dl_root.mkdir(parents=True, exist_ok=True)
     fig_root.mkdir(parents=True, exist_ok=True)
 
+    # (1) manifest 전체를 먼저 훑어서 다운로드 작업 목록 + triplet 구성
+    jobs: list[tuple[str, Path]] = []
+    plans = []
     for t in data["targets"]:
         sensor = t.get("sensor", "UNKNOWN")
         if t.get("status") != "ok":
@@ -219,10 +242,9 @@ def main():
                 a = assets.get(band)
                 if not a or not a.get("href"):
                     raise RuntimeError(f"[{sensor}] Missing href for {item_id} {band} in manifest.")
-                href = a["href"]
 
                 out_path = out_dir / f"{item_id}_{band}.jp2"
-                ensure_download(s3, href, out_path)
+                jobs.append((a["href"], out_path))
                 paths[band] = out_path
 
             triplet.append({
@@ -232,7 +254,32 @@ def main():
                 "paths": paths
             })
 
-        # Create compare figure
+        plans.append((sensor, target_date, search_used, triplet))
+
+    # (2) 누락된 밴드를 한 번에 병렬 다운로드
+    #     같은 객체는 한 번만 받고 나머지 경로는 hardlink/copy
+    jobs, links = dedupe_jobs(jobs)
+    use_async = DOWNLOAD_BACKEND == "async"
+    if use_async and not HAVE_AIO:
+        print("⚠️ S2_DOWNLOAD_BACKEND=async 이지만 aiobotocore/aiofiles 없음 -> threads backend 사용")
+        use_async = False
+    if use_async:
+        asyncio.run(download_all_async(jobs, access_key, secret_key))
+    else:
+        s3 = boto3.client(
+            "s3",
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            endpoint_url=EODATA_ENDPOINT,
+            config=Config(signature_version="s3v4"),
+        )
+        download_all(s3, jobs)
+
+    for src, dst in links:
+        link_or_copy(src, dst)
+
+    # (3) Create compare figures
+    for sensor, target_date, search_used, triplet in plans:
         title = f"{sensor} | target={target_date} | STAC window=±{search_used.get('window_days')}d | cloud<{search_used.get('cloud_lt')}"
         out_png = fig_root / f"{sensor}_{target_date}_top3_compare.png"
         make_triplet_compare_png(triplet, out_png, title=title)
@@ -3,108 +3,8 @@ from __future__ import annotations
 import json
 from pathlib import Path
 
-import numpy as np
-import rasterio
-import matplotlib.pyplot as plt
-
-
-def normalize_rgb_uint8(r: np.ndarray, g: np.ndarray, b: np.ndarray) -> np.ndarray:
-    """
-    Robust percentile stretch + mild gamma for visualization.
-    Input: arrays ~0..10000 (S2 L2A reflectance scaled)
-    Output: HxWx3 uint8
-    """
-    rgb = np.stack([r, g, b], axis=-1).astype(np.float32)
-
-    valid = np.isfinite(rgb) & (rgb > 0)
-    if not np.any(valid):
-        rgb = np.clip(rgb, 0, 10000)
-        rgb = (rgb / 10000.0) * 255.0
-        return np.clip(rgb, 0, 255).astype(np.uint8)
-
-    out = np.zeros_like(rgb, dtype=np.float32)
-    for c in range(3):
-        chan = rgb[..., c]
-        v = chan[np.isfinite(chan) & (chan > 0)]
-        if v.size < 100:
-            vv = chan[np.isfinite(chan)]
-            lo, hi = np.percentile(vv, [2, 98]) if vv.size else (0.0, 1.0)
-        else:
-            lo, hi = np.percentile(v, [2, 98])
-
-        if hi <= lo:
-            lo = float(np.min(v)) if v.size else 0.0
-            hi = float(np.max(v)) if v.size else 1.0
-            if hi <= lo:
-                hi = lo + 1.0
-
-        out[..., c] = np.clip((chan - lo) / (hi - lo), 0, 1)
-
-    gamma = 1.15
-    out = np.power(out, 1.0 / gamma)
-    return (out * 255.0).astype(np.uint8)
-
-
-def read_band_resampled(path: Path, out_shape: tuple[int, int] | None = None) -> np.ndarray:
-    with rasterio.open(path) as ds:
-        if out_shape is None:
-            return ds.read(1)
-        h, w = out_shape
-        return ds.read(
-            1,
-            out_shape=(h, w),
-            resampling=rasterio.enums.Resampling.bilinear,
-        )
-
+from s2_compare_common import make_triplet_compare_png
 
-def make_triplet_compare_png(
-    triplet: list[dict],
-    out_png: Path,
-    title: str,
-    max_side: int = 1400,
-) -> None:
-    panels = []
-    subtitles = []
-
-    for cand in triplet:
-        item_id = cand["id"]
-        dt = cand.get("datetime")
-        cloud = cand.get("eo:cloud_cover")
-        paths = cand["paths"]
-
-        r_path = paths["B04"]
-        g_path = paths["B03"]
-        b_path = paths["B02"]
-
-        with rasterio.open(r_path) as rds:
-            H, W = rds.height, rds.width
-
-        scale = 1.0
-        if max(H, W) > max_side:
-            scale = max_side / float(max(H, W))
-        out_shape = (max(1, int(H * scale)), max(1, int(W * scale)))
-
-        r = read_band_resampled(r_path, out_shape=out_shape)
-        g = read_band_resampled(g_path, out_shape=out_shape)
-        b = read_band_resampled(b_path, out_shape=out_shape)
-
-        rgb8 = normalize_rgb_uint8(r, g, b)
-        panels.append(rgb8)
-        subtitles.append(f"{item_id}\n{dt} | cloud={cloud}")
-
-    n = len(panels)
-    plt.figure(figsize=(6 * n, 6))
-    for i in range(n):
-        ax = plt.subplot(1, n, i + 1)
-        ax.imshow(panels[i])
-        ax.set_title(subtitles[i], fontsize=9)
-        ax.axis("off")
-
-    plt.suptitle(title, fontsize=14)
-    out_png.parent.mkdir(parents=True, exist_ok=True)
-    plt.tight_layout(rect=[0, 0, 1, 0.95])
-    plt.savefig(out_png, dpi=200)
-    plt.close()
 
 def main() -> None:
     manifest_path = Path("downloads") / "s2_stac_picks_manifest.json"
@@ -1,28 +1,102 @@
 from __future__ import annotations
 
 import json
+import os
+import tempfile
+from contextlib import ExitStack
 from pathlib import Path
 import numpy as np
 import rasterio
 from rasterio.enums import Resampling
-import matplotlib.pyplot as plt
+from rasterio.windows import Window
+import matplotlib
+from PIL import Image, ImageDraw, ImageFont, PngImagePlugin
 
+from s2_decode_cache import decode_cache_load, decode_cache_path, decode_cache_save
+
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:  # numba는 선택 사항 -> NumPy 경로로 동작
+    HAVE_NUMBA = False
+
+try:
+    import numexpr as ne
+    ne.set_num_threads(os.cpu_count() or 1)
+    HAVE_NUMEXPR = True
+except ImportError:  # numexpr도 선택 사항 (numba가 없을 때의 fallback)
+    HAVE_NUMEXPR = False
 
 # --- SCL 마스크: 보통 제외 권장 클래스 ---
 # (ESA SCL legend 기준이지만, 필요시 조정하세요)
 # 0 No data, 1 Saturated/defective, 2 Dark area pixels,
 # 3 Cloud shadow, 7/8/9 Clouds, 10 Cirrus, 11 Snow/ice
 SCL_EXCLUDE = {0, 1, 2, 3, 7, 8, 9, 10, 11}
-
-
-def read_resampled(path: Path, ref_profile: dict, resampling: Resampling) -> np.ndarray:
-    """ref_profile의 height/width/transform에 맞춰 리샘플해서 1밴드 읽기"""
-    with rasterio.open(path) as ds:
-        arr = ds.read(
-            1,
-            out_shape=(ref_profile["height"], ref_profile["width"]),
-            resampling=resampling,
-        )
+# numba 커널용 비트마스크: (SCL_BAD_BITS >> scl) & 1 == 1 이면 제외
+SCL_BAD_BITS = sum(1 << c for c in SCL_EXCLUDE)
+# NumPy 경로용 LUT: SCL_BAD_LUT[scl] -> 제외 여부 (uint8 전 범위를 덮도록 256칸)
+SCL_BAD_LUT = np.zeros(256, dtype=bool)
+SCL_BAD_LUT[list(SCL_EXCLUDE)] = True
+
+# GeoTIFF 타일 크기 (window 단위 기록에도 사용)
+GTIFF_BLOCK = 512
+
+# quicklook PNG 긴 변 최대 픽셀 수 (colormap 적용 전에 축소)
+QUICKLOOK_MAX_SIDE = 1400
+
+# scene 처리 전체에 적용할 GDAL 설정 (JP2 decode 멀티스레드, sidecar 탐색 생략)
+GDAL_ENV = {
+    "GDAL_CACHEMAX": 1024,
+    "GDAL_NUM_THREADS": "ALL_CPUS",
+    "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
+}
+
+
+# 배열 하나가 이 크기(bytes)를 넘으면 임시 파일 기반 np.memmap에 할당
+# (10980² float32 ≈ 460 MiB, int16 SCL ≈ 230 MiB -> 10 m float 배열만 page cache로 흘려보냄)
+MEMMAP_THRESHOLD = 256 * 1024 * 1024
+
+
+def alloc_array(shape: tuple[int, ...], dtype, stack: ExitStack) -> np.ndarray:
+    """
+    작은 배열은 np.empty, MEMMAP_THRESHOLD를 넘으면 임시 파일 np.memmap.
+    tempfile.TemporaryFile은 POSIX에선 바로 unlink, Windows에선 delete-on-close로 열리므로
+    매핑이 살아 있어도 삭제 때문에 실패하지 않음 (stack이 닫힐 때 파일 핸들을 닫음).
+    """
+    dtype = np.dtype(dtype)
+    if int(np.prod(shape)) * dtype.itemsize <= MEMMAP_THRESHOLD:
+        return np.empty(shape, dtype=dtype)
+    tmp = stack.enter_context(tempfile.TemporaryFile(prefix="s2idx_", suffix=f".{dtype.name}"))
+    return np.memmap(tmp, dtype=dtype, mode="w+", shape=shape)
+
+
+def read_resampled(
+    path: Path,
+    out_hw: tuple[int, int],
+    resampling: Resampling,
+    ds=None,
+    out: np.ndarray | None = None,
+) -> np.ndarray:
+    """
+    out_hw(기준 그리드 H, W)에 맞춰 리샘플해서 1밴드 읽기 (decode 결과는 디스크 캐시).
+    이미 열린 dataset(ds)을 넘기면 다시 열지 않음.
+    out(shape=out_hw, 예: memmap)을 넘기면 GDAL이 그 dtype으로 변환하며 직접 채움
+    (캐시도 out에 바로 로드 -> 밴드 크기의 중간 배열 없음).
+    """
+    dtype = None if out is None else out.dtype
+    cache_path = decode_cache_path(path, out_hw, resampling.name, dtype=dtype)
+    arr = decode_cache_load(cache_path, out=out)
+    if arr is not None:
+        return arr
+
+    # rasterio: out / out_shape는 동시에 줄 수 없음
+    kw = {"out": out} if out is not None else {"out_shape": out_hw}
+    if ds is None:
+        with rasterio.open(path) as ds:
+            arr = ds.read(1, resampling=resampling, **kw)
+    else:
+        arr = ds.read(1, resampling=resampling, **kw)
+    decode_cache_save(cache_path, arr)
     return arr
 
 
@@ -32,37 +106,200 @@ def safe_index(num: np.ndarray, den: np.ndarray) -> np.ndarray:
     out[m] = (num[m] / den[m]).astype(np.float32)
     return out
 
+
+_NDI_EXPR = "where((a + b) != 0, (a - b) / (a + b), nan_f)"
+
+
+def ndi_numexpr(a: np.ndarray, b: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+    """(a-b)/(a+b), 분모 0이면 NaN — numexpr로 한 번에(블록 단위, 멀티스레드) 계산."""
+    return ne.evaluate(_NDI_EXPR, local_dict={"a": a, "b": b, "nan_f": np.float32(np.nan)}, out=out)
+
+
+if HAVE_NUMBA:
+    # fastmath에서 nnan/ninf는 빼야 NaN/inf 검사가 최적화로 사라지지 않음
+    _FASTMATH = {"nsz", "arcp", "contract", "afn", "reassoc"}
+
+    @njit(fastmath=_FASTMATH, cache=True, inline="always")
+    def _ndi(a, b):
+        den = a + b
+        if np.isfinite(a) and np.isfinite(b) and den != 0:
+            return np.float32((a - b) / den)
+        return np.float32(np.nan)
+
+    @njit(parallel=True, fastmath=_FASTMATH, cache=True)
+    def _indices_kernel(b03, b04, b08, b11, scl, bad_bits, ndvi, ndwi, mndwi):
+        """
+        NDVI/NDWI/MNDWI + SCL 마스크를 한 번의 패스로 계산 (1D 배열).
+        b11/scl이 없으면 길이 0 배열을 넘김.
+        """
+        n = b03.size
+        has_b11 = b11.size == n
+        has_scl = scl.size == n
+        for i in prange(n):
+            if has_scl:
+                c = scl[i]
+                if c >= 0 and c < 64 and (bad_bits >> c) & 1:
+                    ndvi[i] = np.nan
+                    ndwi[i] = np.nan
+                    if has_b11:
+                        mndwi[i] = np.nan
+                    continue
+            g = b03[i]
+            nir = b08[i]
+            ndvi[i] = _ndi(nir, b04[i])
+            ndwi[i] = _ndi(g, nir)  # McFeeters NDWI
+            if has_b11:
+                mndwi[i] = _ndi(g, b11[i])
+
+
+def compute_indices(
+    b03: np.ndarray,
+    b04: np.ndarray,
+    b08: np.ndarray,
+    b11: np.ndarray | None = None,
+    scl: np.ndarray | None = None,
+    out: tuple[np.ndarray, np.ndarray, np.ndarray | None] | None = None,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray | None]:
+    """
+    Return (ndvi, ndwi, mndwi) as float32, SCL_EXCLUDE 픽셀은 NaN.
+    mndwi는 b11이 없으면 None.
+    out=(ndvi, ndwi, mndwi)로 C-contiguous 결과 배열(예: memmap)을 미리 넘길 수 있음.
+    """
+    shape = b03.shape
+    if out is None:
+        out = (
+            np.empty(shape, dtype=np.float32),
+            np.empty(shape, dtype=np.float32),
+            np.empty(shape, dtype=np.float32) if b11 is not None else None,
+        )
+    ndvi, ndwi, mndwi = out
+    if b11 is None:
+        mndwi = None
+
+    if HAVE_NUMBA:
+        empty_f = np.empty(0, dtype=np.float32)
+        empty_i = np.empty(0, dtype=np.int16)
+        _indices_kernel(
+            np.ascontiguousarray(b03, dtype=np.float32).ravel(),
+            np.ascontiguousarray(b04, dtype=np.float32).ravel(),
+            np.ascontiguousarray(b08, dtype=np.float32).ravel(),
+            np.ascontiguousarray(b11, dtype=np.float32).ravel() if b11 is not None else empty_f,
+            np.ascontiguousarray(scl, dtype=np.int16).ravel() if scl is not None else empty_i,
+            SCL_BAD_BITS,
+            ndvi.ravel(), ndwi.ravel(), mndwi.ravel() if mndwi is not None else empty_f,
+        )
+        return ndvi, ndwi, mndwi
+
+    if HAVE_NUMEXPR:
+        ndi_numexpr(b08, b04, out=ndvi)
+        ndi_numexpr(b03, b08, out=ndwi)  # McFeeters NDWI
+        if mndwi is not None:
+            ndi_numexpr(b03, b11, out=mndwi)
+    else:
+        ndvi[...] = safe_index((b08 - b04), (b08 + b04))
+        ndwi[...] = safe_index((b03 - b08), (b03 + b08))  # McFeeters NDWI
+
+        if mndwi is not None:
+            mndwi[...] = safe_index((b03 - b11), (b03 + b11))
+
+    # --- SCL mask 적용 ---
+    if scl is not None:
+        mask_bad = SCL_BAD_LUT[scl.astype(np.uint8, copy=False)]
+        ndvi[mask_bad] = np.nan
+        ndwi[mask_bad] = np.nan
+        if mndwi is not None:
+            mndwi[mask_bad] = np.nan
+
+    return ndvi, ndwi, mndwi
+
+
 def write_geotiff(out_path: Path, ref_profile: dict, arr: np.ndarray) -> None:
     out_path.parent.mkdir(parents=True, exist_ok=True)
     profile = ref_profile.copy()
 
+    # float32 + NaN: ZSTD + floating-point predictor(3), 512 타일 단위로 기록
     profile.update(
         driver="GTiff",
         dtype="float32",
         count=1,
         nodata=np.nan,
-        compress="DEFLATE",
-        predictor=2,
+        compress="ZSTD",
+        zstd_level=3,
+        predictor=3,
         tiled=True,
+        blockxsize=GTIFF_BLOCK,
+        blockysize=GTIFF_BLOCK,
+        bigtiff="IF_SAFER",
+        num_threads="ALL_CPUS",
     )
 
     profile.pop("photometric", None)
     profile.pop("interleave", None)
 
-    with rasterio.open(out_path, "w", **profile) as dst:
-        dst.write(arr.astype(np.float32), 1)
+    arr = arr.astype(np.float32, copy=False)
+    h, w = arr.shape
+    with rasterio.Env(GDAL_NUM_THREADS="ALL_CPUS", GDAL_CACHEMAX=512):
+        with rasterio.open(out_path, "w", **profile) as dst:
+            for y in range(0, h, GTIFF_BLOCK):
+                for x in range(0, w, GTIFF_BLOCK):
+                    win = Window(x, y, min(GTIFF_BLOCK, w - x), min(GTIFF_BLOCK, h - y))
+                    dst.write(arr[y:y + win.height, x:x + win.width], 1, window=win)
+
+
+def _load_font(size: int):
+    try:
+        return ImageFont.load_default(size=size)  # Pillow >= 10.1
+    except TypeError:
+        return ImageFont.load_default()
 
 
 def save_quicklook_png(out_png: Path, arr: np.ndarray, title: str, vmin: float = -1, vmax: float = 1) -> None:
+    """
+    arr -> (긴 변 QUICKLOOK_MAX_SIDE 이하로 strided 축소) -> viridis -> PNG.
+    matplotlib figure 없이 colormap만 사용하고, 제목/colorbar는 PIL로 그림 (NaN은 흰 배경).
+    축소를 먼저 하므로 전체 해상도 RGBA/float64 임시 배열을 만들지 않음 (arr가 memmap이어도 OK).
+    """
     out_png.parent.mkdir(parents=True, exist_ok=True)
-    plt.figure(figsize=(7, 6))
-    im = plt.imshow(arr, vmin=vmin, vmax=vmax)
-    plt.title(title, fontsize=10)
-    plt.colorbar(im, fraction=0.046, pad=0.04)
-    plt.axis("off")
-    plt.tight_layout()
-    plt.savefig(out_png, dpi=200)
-    plt.close()
+    step = max(1, -(-max(arr.shape) // QUICKLOOK_MAX_SIDE))
+    x = np.clip(arr[::step, ::step], vmin, vmax)  # strided view -> 작은 복사본 하나
+    x -= vmin
+    x /= vmax - vmin
+    cmap = matplotlib.colormaps["viridis"]
+    rgba = cmap(x, bytes=True)
+    h, w = x.shape
+
+    gap, bar_w, n_ticks = 8, 24, 5
+    font_title = _load_font(20)
+    font_tick = _load_font(14)
+    probe = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+    ticks = np.linspace(vmin, vmax, n_ticks)
+    labels = [f"{v:.2f}" for v in ticks]
+    tick_w = max(probe.textbbox((0, 0), s, font=font_tick)[2] for s in labels)
+    tx0, ty0, tx1, ty1 = probe.textbbox((0, 0), title, font=font_title)
+    title_h = (ty1 - ty0) + 2 * gap
+
+    W = max(gap + w + 2 * gap + bar_w + gap + tick_w + gap, (tx1 - tx0) + 2 * gap)
+    H = title_h + h + gap
+    canvas = Image.new("RGB", (W, H), "white")
+    img = Image.fromarray(rgba)
+    canvas.paste(img, (gap, title_h), img)  # alpha(NaN=0)로 합성 -> NaN은 흰색
+
+    # colorbar: 위쪽이 vmax
+    bar_x = gap + w + 2 * gap
+    grad = cmap(np.linspace(1.0, 0.0, h)[:, None].repeat(bar_w, axis=1), bytes=True)
+    canvas.paste(Image.fromarray(grad).convert("RGB"), (bar_x, title_h))
+
+    draw = ImageDraw.Draw(canvas)
+    draw.rectangle([bar_x, title_h, bar_x + bar_w - 1, title_h + h - 1], outline="black")
+    draw.text(((W - (tx1 - tx0)) // 2, gap), title, fill="black", font=font_title)
+    for v, label in zip(ticks, labels):
+        y = title_h + int(round((vmax - v) / (vmax - vmin) * (h - 1)))
+        draw.line([bar_x + bar_w, y, bar_x + bar_w + 4, y], fill="black")
+        draw.text((bar_x + bar_w + 6, y), label, fill="black", font=font_tick, anchor="lm")
+
+    info = PngImagePlugin.PngInfo()
+    info.add_text("Title", title)
+    canvas.save(out_png, compress_level=1, pnginfo=info)
 
 
 def main() -> None:
@@ -76,102 +313,101 @@ def main() -> None:
 
     data = json.loads(manifest_path.read_text(encoding="utf-8"))
 
-    for t in data.get("targets", []):
-        sensor = t.get("sensor", "UNKNOWN")
-        if t.get("status") != "ok":
-            continue
-
-        cands = t.get("candidates_topk", [])
-        assets = t.get("candidates_topk_rgb_assets", [])
-        n = min(len(cands), len(assets))
-        if n == 0:
-            continue
-
-        for i in range(n):
-            item_id = cands[i]["id"]
-            entry = assets[i]  # candidates_topk_rgb_assets[i]
-            print("DEBUG entry keys:", entry.keys())
-            bands = entry.get("bands", {}) or {}
-            extra = entry.get("index") or entry.get("index_extra") or {}
-
-            # 필수 키 확인
-            if not (bands.get("B03") and bands.get("B04") and extra.get("B08") and extra.get("B11") and extra.get("SCL")):
-                print(f"[{sensor}] {item_id}: required bands missing (need B03, B04, B08, B11, SCL). skip")
+    with rasterio.Env(**GDAL_ENV):
+        for t in data.get("targets", []):
+            sensor = t.get("sensor", "UNKNOWN")
+            if t.get("status") != "ok":
+                continue
+
+            cands = t.get("candidates_topk", [])
+            assets = t.get("candidates_topk_rgb_assets", [])
+            n = min(len(cands), len(assets))
+            if n == 0:
                 continue
 
-            base = dl_root / sensor / item_id
-
-            # --- 경로 구성 ---
-            p_b03 = None
-            if bands.get("B03"):
-                p_b03 = base / f"{item_id}_{bands['B03']['key']}.jp2"
-            p_b04 = None
-            if bands.get("B04"):
-                p_b04 = base / f"{item_id}_{bands['B04']['key']}.jp2"
-            p_b08 = None
-            if extra.get("B08"):
-                p_b08 = base / f"{item_id}_{extra['B08']['key']}.jp2"
-            p_b11 = None
-            if extra.get("B11"):
-                p_b11 = base / f"{item_id}_{extra['B11']['key']}.jp2"
-            p_scl = None
-            if extra.get("SCL"):
-                p_scl = base / f"{item_id}_{extra['SCL']['key']}.jp2"
-            # 필수 밴드 확인
-            for p in [p_b03, p_b04, p_b08]:
-                if not p.exists():
-                    raise FileNotFoundError(f"Missing required band: {p}\n(먼저 B03/B04/B08 다운로드 필요)")
-
-            # B03_10m을 기준 그리드로 사용
-            with rasterio.open(p_b03) as ref:
-                ref_profile = ref.profile
-
-            b03 = read_resampled(p_b03, ref_profile, Resampling.bilinear).astype(np.float32)
-            b04 = read_resampled(p_b04, ref_profile, Resampling.bilinear).astype(np.float32)
-            b08 = read_resampled(p_b08, ref_profile, Resampling.bilinear).astype(np.float32)
-
-            # SCL(20m)은 nearest가 정석
-            scl = None
-            if p_scl and p_scl.exists():
-                scl = read_resampled(p_scl, ref_profile, Resampling.nearest).astype(np.int16)
-
-            # B11(20m)은 bilinear로 10m로 맞춤
-            b11 = None
-            if p_b11 and p_b11.exists():
-                b11 = read_resampled(p_b11, ref_profile, Resampling.bilinear).astype(np.float32)
-
-            # --- indices ---
-            ndvi = safe_index((b08 - b04), (b08 + b04))
-            ndwi = safe_index((b03 - b08), (b03 + b08))  # McFeeters NDWI
-
-            mndwi = None
-            if b11 is not None:
-                mndwi = safe_index((b03 - b11), (b03 + b11))
-
-            # --- SCL mask 적용 ---
-            if scl is not None:
-                mask_bad = np.isin(scl, list(SCL_EXCLUDE))
-                ndvi[mask_bad] = np.nan
-                ndwi[mask_bad] = np.nan
-                if mndwi is not None:
-                    mndwi[mask_bad] = np.nan
-
-            out_dir = out_root / sensor / item_id
-            out_dir.mkdir(parents=True, exist_ok=True)
-
-            # save tifs
-            write_geotiff(out_dir / f"{item_id}_NDVI.tif", ref_profile, ndvi)
-            write_geotiff(out_dir / f"{item_id}_NDWI.tif", ref_profile, ndwi)
-            if mndwi is not None:
-                write_geotiff(out_dir / f"{item_id}_MNDWI.tif", ref_profile, mndwi)
-
-            # quicklook png
-            save_quicklook_png(out_dir / f"{item_id}_NDVI.png", ndvi, f"{sensor} NDVI | {item_id}", vmin=-0.2, vmax=0.9)
-            save_quicklook_png(out_dir / f"{item_id}_NDWI.png", ndwi, f"{sensor} NDWI | {item_id}", vmin=-1, vmax=1)
-            if mndwi is not None:
-                save_quicklook_png(out_dir / f"{item_id}_MNDWI.png", mndwi, f"{sensor} MNDWI | {item_id}", vmin=-1, vmax=1)
-
-            print(f"✅ [{sensor}] {item_id}: NDVI/NDWI" + ("/MNDWI" if mndwi is not None else "") + " saved")
+            for i in range(n):
+                item_id = cands[i]["id"]
+                entry = assets[i]  # candidates_topk_rgb_assets[i]
+                print("DEBUG entry keys:", entry.keys())
+                bands = entry.get("bands", {}) or {}
+                extra = entry.get("index") or entry.get("index_extra") or {}
+
+                # 필수 키 확인
+                if not (bands.get("B03") and bands.get("B04") and extra.get("B08") and extra.get("B11") and extra.get("SCL")):
+                    print(f"[{sensor}] {item_id}: required bands missing (need B03, B04, B08, B11, SCL). skip")
+                    continue
+
+                base = dl_root / sensor / item_id
+
+                # --- 경로 구성 ---
+                p_b03 = None
+                if bands.get("B03"):
+                    p_b03 = base / f"{item_id}_{bands['B03']['key']}.jp2"
+                p_b04 = None
+                if bands.get("B04"):
+                    p_b04 = base / f"{item_id}_{bands['B04']['key']}.jp2"
+                p_b08 = None
+                if extra.get("B08"):
+                    p_b08 = base / f"{item_id}_{extra['B08']['key']}.jp2"
+                p_b11 = None
+                if extra.get("B11"):
+                    p_b11 = base / f"{item_id}_{extra['B11']['key']}.jp2"
+                p_scl = None
+                if extra.get("SCL"):
+                    p_scl = base / f"{item_id}_{extra['SCL']['key']}.jp2"
+                # 필수 밴드 확인
+                for p in [p_b03, p_b04, p_b08]:
+                    if not p.exists():
+                        raise FileNotFoundError(f"Missing required band: {p}\n(먼저 B03/B04/B08 다운로드 필요)")
+
+                # 큰 배열은 memmap(임시 파일)으로 할당 -> scene 처리가 끝나면 삭제
+                with ExitStack() as stack:
+                    # B03_10m을 기준 그리드로 사용 (한 번 열어서 profile + 배열)
+                    with rasterio.open(p_b03) as ref:
+                        ref_profile = ref.profile
+                        out_hw = (ref.height, ref.width)
+                        b03 = read_resampled(
+                            p_b03, out_hw, Resampling.bilinear, ds=ref,
+                            out=alloc_array(out_hw, np.float32, stack),
+                        )
+
+                    b04 = read_resampled(p_b04, out_hw, Resampling.bilinear, out=alloc_array(out_hw, np.float32, stack))
+                    b08 = read_resampled(p_b08, out_hw, Resampling.bilinear, out=alloc_array(out_hw, np.float32, stack))
+
+                    # SCL(20m)은 nearest가 정석
+                    scl = None
+                    if p_scl and p_scl.exists():
+                        scl = read_resampled(p_scl, out_hw, Resampling.nearest, out=alloc_array(out_hw, np.int16, stack))
+
+                    # B11(20m)은 bilinear로 10m로 맞춤
+                    b11 = None
+                    if p_b11 and p_b11.exists():
+                        b11 = read_resampled(p_b11, out_hw, Resampling.bilinear, out=alloc_array(out_hw, np.float32, stack))
+
+                    # --- indices (+ SCL mask) ---
+                    out = (
+                        alloc_array(out_hw, np.float32, stack),
+                        alloc_array(out_hw, np.float32, stack),
+                        alloc_array(out_hw, np.float32, stack) if b11 is not None else None,
+                    )
+                    ndvi, ndwi, mndwi = compute_indices(b03, b04, b08, b11=b11, scl=scl, out=out)
+
+                    out_dir = out_root / sensor / item_id
+                    out_dir.mkdir(parents=True, exist_ok=True)
+
+                    # save tifs
+                    write_geotiff(out_dir / f"{item_id}_NDVI.tif", ref_profile, ndvi)
+                    write_geotiff(out_dir / f"{item_id}_NDWI.tif", ref_profile, ndwi)
+                    if mndwi is not None:
+                        write_geotiff(out_dir / f"{item_id}_MNDWI.tif", ref_profile, mndwi)
+
+                    # quicklook png
+                    save_quicklook_png(out_dir / f"{item_id}_NDVI.png", ndvi, f"{sensor} NDVI | {item_id}", vmin=-0.2, vmax=0.9)
+                    save_quicklook_png(out_dir / f"{item_id}_NDWI.png", ndwi, f"{sensor} NDWI | {item_id}", vmin=-1, vmax=1)
+                    if mndwi is not None:
+                        save_quicklook_png(out_dir / f"{item_id}_MNDWI.png", mndwi, f"{sensor} MNDWI | {item_id}", vmin=-1, vmax=1)
+
+                    print(f"✅ [{sensor}] {item_id}: NDVI/NDWI" + ("/MNDWI" if mndwi is not None else "") + " saved")
 
     print("\n✅ Done. outputs -> downloads/S2_INDICES")
 
@@ -1,37 +1,290 @@
 from __future__ import annotations
 
 import json
+import math
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional, Tuple
 
 import numpy as np
+import pyproj
 import rasterio
 from rasterio.enums import Resampling
-from rasterio.windows import from_bounds
+from rasterio.env import GDALVersion
+from rasterio.windows import Window, from_bounds
 from rasterio.transform import Affine
 
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:  # numba는 선택 사항 -> NumPy 경로로 동작
+    HAVE_NUMBA = False
 
-def percentile_stretch(x: np.ndarray, p_low=2.0, p_high=98.0) -> np.ndarray:
-    """Scale to [0,1] using percentile stretch (robust to outliers)."""
-    x = x.astype(np.float32)
+try:
+    import imagecodecs
+    HAVE_IMAGECODECS = True
+except ImportError:  # imagecodecs는 선택 사항 -> rasterio PNG driver로 저장
+    HAVE_IMAGECODECS = False
+
+try:
+    import cupy as cp
+    from nvidia import nvimgcodec  # nvJPEG2000 기반 GPU JP2 decoder
+    HAVE_NVJPEG2K = True
+except ImportError:  # GPU backend는 선택 사항 -> CPU(GDAL/OpenJPEG)로 동작
+    HAVE_NVJPEG2K = False
+
+
+# JP2 decode 멀티스레드 + sidecar 탐색 생략
+GDAL_ENV = {
+    "GDAL_NUM_THREADS": "ALL_CPUS",
+    "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
+}
+
+# JP2 decode backend: "cpu"(GDAL/OpenJPEG, 기본) 또는 "nvjpeg2k"(GPU, cupy + nvImageCodec 필요)
+# nvjpeg2k는 실험적 opt-in (실제 GPU에서 검증 안 됨): 타일 전체를 decode하므로 AOI crop이 있으면 CPU 사용
+JP2_BACKEND = os.environ.get("S2_JP2_BACKEND", "cpu").lower()
+
+# GTiff ZSTD는 GDAL 3.1+ (그 이전이면 deflate)
+GTIFF_COMPRESS = "zstd" if GDALVersion.runtime().at_least("3.1") else "deflate"
+
+# 밴드 -> RGB GeoTIFF 스트리밍 기록 시 한 번에 처리할 행 수 (GTiff 256 블록의 배수)
+STRIP_ROWS = 1024
+
+# 스트리밍 기록 시 퍼센타일은 축소 읽기(긴 변 최대 이 픽셀 수)에서 추정
+STATS_MAX_DIM = 2048
+
+# bincount는 입력을 intp로 변환하므로 한 번에 이 개수(원소)씩 나눠서 누적
+HIST_CHUNK = 1 << 22
+
+
+def _int_histogram(a: np.ndarray) -> np.ndarray:
+    """uint8/uint16 배열의 값별 도수 (길이 256 또는 65536)."""
+    flat = a.ravel()
+    hist = np.zeros(np.iinfo(a.dtype).max + 1, dtype=np.int64)
+    for i in range(0, flat.size, HIST_CHUNK):
+        hist += np.bincount(flat[i:i + HIST_CHUNK], minlength=hist.size)
+    return hist
+
+
+def _percentile_int(a: np.ndarray, p_low: float, p_high: float) -> tuple[float, float, float, float]:
+    """
+    정수 배열의 (p_low, p_high) 퍼센타일 + (min, max) — 정렬 없이 히스토그램 누적합으로 계산.
+    np.percentile(linear 보간)과 같은 값을 냄.
+    """
+    return _percentile_from_hist(_int_histogram(a), p_low, p_high)
+
+
+def _percentile_from_hist(hist: np.ndarray, p_low: float, p_high: float) -> tuple[float, float, float, float]:
+    """값별 도수(hist)에서 (p_low, p_high) 퍼센타일 + (min, max)."""
+    cdf = np.cumsum(hist)
+    n = int(cdf[-1])
+    nz = np.flatnonzero(np.diff(cdf, prepend=0))
+    vmin, vmax = float(nz[0]), float(nz[-1])
+
+    def pct(p: float) -> float:
+        rank = p / 100.0 * (n - 1)
+        k = int(np.floor(rank))
+        # sorted[k] = cdf가 k를 처음 넘는 값
+        v0, v1 = np.searchsorted(cdf, [k, min(k + 1, n - 1)], side="right")
+        return float(v0) + (rank - k) * float(v1 - v0)
+
+    return pct(p_low), pct(p_high), vmin, vmax
+
+
+def _stretch_limits(x: np.ndarray, p_low=2.0, p_high=98.0) -> tuple[float, float] | None:
+    """percentile_stretch의 (lo, hi). 유효 범위를 못 구하면 None."""
+    if x.dtype in (np.uint8, np.uint16) and x.size > 0:
+        # JP2 원본(uint16)/TCI(uint8): 히스토그램으로 임계값을 먼저 구하고 나서 float32 변환
+        lo, hi, vmin, vmax = _percentile_int(x, p_low, p_high)
+        if hi <= lo:
+            lo, hi = vmin, vmax
+        return (lo, hi) if hi > lo else None
+
+    x = x.astype(np.float32, copy=False)
     lo = np.nanpercentile(x, p_low)
     hi = np.nanpercentile(x, p_high)
     if not np.isfinite(lo) or not np.isfinite(hi) or hi <= lo:
         # fallback
-        lo = float(np.nanmin(x))
-        hi = float(np.nanmax(x))
+        lo, hi = _nan_minmax(x)
         if not np.isfinite(lo) or not np.isfinite(hi) or hi <= lo:
-            return np.zeros_like(x, dtype=np.float32)
-    y = (x - lo) / (hi - lo)
-    return np.clip(y, 0.0, 1.0)
+            return None
+    return float(lo), float(hi)
 
 
-def apply_gamma(x01: np.ndarray, gamma: float = 1.0) -> np.ndarray:
-    """Gamma correction on [0,1]. gamma<1 brighter, gamma>1 darker."""
+def percentile_stretch(x: np.ndarray, p_low=2.0, p_high=98.0, out: np.ndarray | None = None) -> np.ndarray:
+    """
+    Scale to [0,1] using percentile stretch (robust to outliers).
+    out(float32, x와 같은 shape)을 넘기면 새 배열을 만들지 않고 그 안에 기록.
+    """
+    if out is None:
+        out = np.empty(x.shape, dtype=np.float32)
+    lim = _stretch_limits(x, p_low, p_high)
+    if lim is None:
+        out[...] = 0
+        return out
+    return _stretch_into(x, lim, out)
+
+
+def _stretch_into(x: np.ndarray, lim: tuple[float, float], out: np.ndarray) -> np.ndarray:
+    """(x - lo) / (hi - lo) -> [0,1] clip 을 out(float32)에 기록."""
+    lo, hi = lim
+    scale = np.float32(1.0 / (hi - lo))
+    if HAVE_NUMBA and x.ndim == 2 and x.dtype.kind in "uif":
+        _stretch_clip_f32(x, np.float32(lo), scale, out)
+        return out
+    np.subtract(x, np.float32(lo), out=out, dtype=np.float32)
+    out *= scale
+    return np.clip(out, 0.0, 1.0, out=out)
+
+
+def _nan_minmax(x: np.ndarray) -> tuple[float, float]:
+    """NaN을 제외한 (min, max). numba가 있으면 한 번의 병렬 패스로 둘 다 계산."""
+    if HAVE_NUMBA and x.ndim == 2 and x.size > 0:
+        lo, hi = _nan_minmax_2d(x)
+        return float(lo), float(hi)
+    return float(np.nanmin(x)), float(np.nanmax(x))
+
+
+def apply_gamma(x01: np.ndarray, gamma: float = 1.0, out: np.ndarray | None = None) -> np.ndarray:
+    """Gamma correction on [0,1]. gamma<1 brighter, gamma>1 darker. out=x01이면 in-place."""
     if gamma is None or gamma == 1.0:
-        return x01
-    x01 = np.clip(x01, 0.0, 1.0)
-    return np.power(x01, 1.0 / float(gamma))
+        if out is None or out is x01:
+            return x01
+        out[...] = x01
+        return out
+    out = np.clip(x01, 0.0, 1.0, out=out)
+    return np.power(out, 1.0 / float(gamma), out=out)
+
+
+def to_uint8(x01: np.ndarray) -> np.ndarray:
+    """[0,1] float -> uint8 (반올림)."""
+    return (np.clip(x01, 0, 1) * 255.0 + 0.5).astype(np.uint8)
+
+
+if HAVE_NUMBA:
+    # float 경로: fastmath에서 nnan/ninf는 빼야 NaN 검사/전파가 최적화로 사라지지 않음
+    _FASTMATH = {"nsz", "arcp", "contract", "afn", "reassoc"}
+
+    @njit(parallel=True, fastmath=_FASTMATH, cache=True)
+    def _nan_minmax_2d(x):
+        """행별 (min, max)를 병렬로 구한 뒤 합침 (NaN 제외, 전부 NaN이면 (inf, -inf))."""
+        h, w = x.shape
+        row_min = np.empty(h, dtype=np.float64)
+        row_max = np.empty(h, dtype=np.float64)
+        for i in prange(h):
+            lo = np.inf
+            hi = -np.inf
+            for j in range(w):
+                v = x[i, j]
+                if not np.isnan(v):
+                    lo = min(lo, v)
+                    hi = max(hi, v)
+            row_min[i] = lo
+            row_max[i] = hi
+        return row_min.min(), row_max.max()
+
+    @njit(parallel=True, fastmath=_FASTMATH, cache=True)
+    def _stretch_clip_f32(x, lo, scale, out):
+        """(x - lo) * scale -> [0,1] clip, float32로 기록 (NaN은 그대로 NaN)."""
+        h, w = x.shape
+        for i in prange(h):
+            for j in range(w):
+                v = (np.float32(x[i, j]) - lo) * scale
+                if v < 0:
+                    v = np.float32(0.0)
+                elif v > 1:
+                    v = np.float32(1.0)
+                out[i, j] = v
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _stretch_gamma_u8(band, lo, scale, inv_gamma, out_u8):
+        """(band - lo) * scale -> [0,1] clip -> ** inv_gamma -> uint8, 한 번의 패스 (2D)."""
+        h, w = band.shape
+        apply_pow = inv_gamma != 1.0
+        for i in prange(h):
+            for j in range(w):
+                v = (np.float32(band[i, j]) - lo) * scale
+                v = np.float32(0.0) if v < 0 else (np.float32(1.0) if v > 1 else v)
+                if apply_pow:
+                    v = v ** inv_gamma
+                out_u8[i, j] = np.uint8(v * np.float32(255.0) + np.float32(0.5))
+
+
+def stretch_to_uint8(
+    x: np.ndarray,
+    p_low=2.0, p_high=98.0, gamma=1.0,
+    out: np.ndarray | None = None,
+) -> np.ndarray:
+    """
+    percentile_stretch -> apply_gamma -> uint8 양자화.
+    numba가 있으면 float 중간 배열 없이 원본 밴드에서 uint8로 바로 기록.
+    """
+    return apply_stretch_uint8(x, _stretch_limits(x, p_low, p_high), gamma, out=out)
+
+
+def apply_stretch_uint8(
+    x: np.ndarray,
+    lim: tuple[float, float] | None,
+    gamma=1.0,
+    out: np.ndarray | None = None,
+) -> np.ndarray:
+    """이미 구한 (lo, hi)로 stretch -> gamma -> uint8 (lim이 None이면 0)."""
+    if out is None:
+        out = np.empty(x.shape, dtype=np.uint8)
+    if lim is None:
+        out[...] = 0
+        return out
+    lo, hi = lim
+    if HAVE_NUMBA and x.ndim == 2 and x.dtype.kind in "ui":
+        inv_gamma = 1.0 if gamma is None or gamma == 1.0 else 1.0 / float(gamma)
+        _stretch_gamma_u8(x, np.float32(lo), np.float32(1.0 / (hi - lo)), np.float32(inv_gamma), out)
+        return out
+
+    # NumPy 경로: float32 작업 버퍼 하나로 stretch -> gamma -> 양자화 (in-place)
+    y = _stretch_into(x, lim, np.empty(x.shape, dtype=np.float32))
+    apply_gamma(y, gamma, out=y)
+    y *= np.float32(255.0)
+    y += np.float32(0.5)
+    np.copyto(out, y, casting="unsafe")
+    return out
+
+
+@lru_cache(maxsize=32)
+def _cached_transformer(src_wkt: str, dst_wkt: str) -> pyproj.Transformer:
+    """CRS 쌍별 Transformer 재사용 (생성 비용이 transform 호출보다 훨씬 큼)."""
+    return pyproj.Transformer.from_crs(src_wkt, dst_wkt, always_xy=True)
+
+
+def _transform_bounds(src_crs, dst_crs, bounds, densify_pts: int = 21) -> tuple[float, float, float, float]:
+    """
+    rasterio.warp.transform_bounds와 같은 방식(각 변에 densify_pts개 점 추가)으로
+    bounds를 변환하되, 캐시된 Transformer 사용.
+    """
+    src_wkt = rasterio.crs.CRS.from_user_input(src_crs).to_wkt()
+    dst_wkt = rasterio.crs.CRS.from_user_input(dst_crs).to_wkt()
+    tr = _cached_transformer(src_wkt, dst_wkt)
+
+    minx, miny, maxx, maxy = bounds
+    t = np.linspace(0.0, 1.0, densify_pts + 2)
+    xs = np.concatenate([minx + (maxx - minx) * t, np.full_like(t, maxx), maxx - (maxx - minx) * t, np.full_like(t, minx)])
+    ys = np.concatenate([np.full_like(t, miny), miny + (maxy - miny) * t, np.full_like(t, maxy), maxy - (maxy - miny) * t])
+    xx, yy = tr.transform(xs, ys)
+    return float(np.min(xx)), float(np.min(yy)), float(np.max(xx)), float(np.max(yy))
+
+
+def _aoi_window(src, aoi_bounds, aoi_bounds_crs: str = "EPSG:4326") -> Window:
+    """AOI bounds(aoi_bounds_crs) -> src 픽셀 window (dataset 범위로 clamp). None이면 전체."""
+    if aoi_bounds is None:
+        return Window(0, 0, src.width, src.height)
+    b = _transform_bounds(aoi_bounds_crs, src.crs, aoi_bounds, densify_pts=21)
+    win = from_bounds(*b, transform=src.transform)
+    win = win.round_offsets().round_lengths()
+    return win.intersection(Window(0, 0, src.width, src.height))
 
 
 def read_one_band(
@@ -40,67 +293,103 @@ def read_one_band(
     aoi_bounds_crs: str = "EPSG:4326",
 ) -> tuple[np.ndarray, Affine, rasterio.crs.CRS]:
     """
-    Read single-band JP2 as array.
+    Read single-band JP2 as numpy array (CPU, GDAL/OpenJPEG).
     Optionally crop by aoi_bounds (minx, miny, maxx, maxy) in aoi_bounds_crs.
     """
-    with rasterio.open(path) as src:
+    # rasterio.Env는 스레드 로컬 -> worker 스레드에서도 적용되도록 여기서 설정
+    with rasterio.Env(**GDAL_ENV), rasterio.open(path) as src:
         if aoi_bounds is None:
             arr = src.read(1)
             return arr, src.transform, src.crs
 
-        # transform AOI bounds CRS -> src CRS
-        from rasterio.warp import transform_bounds
-
-        b = transform_bounds(aoi_bounds_crs, src.crs, *aoi_bounds, densify_pts=21)
-        win = from_bounds(*b, transform=src.transform)
-        win = win.round_offsets().round_lengths()
-
-        # clamp window to dataset
-        win = win.intersection(rasterio.windows.Window(0, 0, src.width, src.height))
+        # transform AOI bounds CRS -> src CRS (dataset 범위로 clamp)
+        win = _aoi_window(src, aoi_bounds, aoi_bounds_crs)
 
         arr = src.read(1, window=win)
         transform = rasterio.windows.transform(win, src.transform)
         return arr, transform, src.crs
 
 
-def save_rgb_geotiff(
-    out_tif: Path,
-    rgb01: np.ndarray,
-    transform: Affine,
-    crs,
-) -> None:
+def _open_bands(stack: ExitStack, paths, aoi_bounds=None, aoi_bounds_crs="EPSG:4326"):
     """
-    rgb01: float32 [3,H,W] in [0,1]
-    Save as uint8 GeoTIFF (3 bands).
+    같은 그리드의 밴드들을 stack 안에서 한 번씩만 열고, AOI window도 한 번만 계산.
+    Returns (srcs, win, transform, crs)
     """
-    out_tif.parent.mkdir(parents=True, exist_ok=True)
-    rgb8 = (np.clip(rgb01, 0, 1) * 255.0 + 0.5).astype(np.uint8)
+    stack.enter_context(rasterio.Env(**GDAL_ENV))
+    srcs = [stack.enter_context(rasterio.open(p)) for p in paths]
+
+    # sanity (대부분 동일해야 함)
+    ref = srcs[0]
+    if any(src.crs != ref.crs for src in srcs):
+        raise RuntimeError("CRS mismatch among bands.")
+    if any(src.transform != ref.transform or src.shape != ref.shape for src in srcs):
+        raise RuntimeError("Band grids mismatch (shape/transform). Crop bounds must be consistent.")
+
+    win = _aoi_window(ref, aoi_bounds, aoi_bounds_crs)
+    return srcs, win, rasterio.windows.transform(win, ref.transform), ref.crs
 
+
+def _read_window(src, win: Window) -> np.ndarray:
+    # rasterio.Env는 스레드 로컬 -> worker 스레드에서도 적용되도록 여기서 설정
+    with rasterio.Env(**GDAL_ENV):
+        return src.read(1, window=win)
+
+
+def _rgb_geotiff_profile(height: int, width: int, transform: Affine, crs) -> dict:
     profile = {
         "driver": "GTiff",
-        "height": rgb8.shape[1],
-        "width": rgb8.shape[2],
+        "height": height,
+        "width": width,
         "count": 3,
         "dtype": "uint8",
         "crs": crs,
         "transform": transform,
-        "compress": "deflate",
+        "compress": GTIFF_COMPRESS,
         "predictor": 2,
+        "interleave": "pixel",  # RGB를 한 블록에 같이 압축
         "tiled": True,
         "blockxsize": 256,
         "blockysize": 256,
+        "bigtiff": "IF_SAFER",
+        "num_threads": "all_cpus",  # 압축 멀티스레드
     }
+    if GTIFF_COMPRESS == "zstd":
+        profile["zstd_level"] = 9
+    return profile
+
 
+def save_rgb_geotiff(
+    out_tif: Path,
+    rgb8: np.ndarray,
+    transform: Affine,
+    crs,
+) -> None:
+    """
+    rgb8: uint8 [3,H,W] (float32 [0,1]이면 여기서 uint8로 변환)
+    Save as uint8 GeoTIFF (3 bands).
+    """
+    out_tif.parent.mkdir(parents=True, exist_ok=True)
+    if rgb8.dtype != np.uint8:
+        rgb8 = to_uint8(rgb8)
+
+    profile = _rgb_geotiff_profile(rgb8.shape[1], rgb8.shape[2], transform, crs)
     with rasterio.open(out_tif, "w", **profile) as dst:
-        dst.write(rgb8[0], 1)  # R
-        dst.write(rgb8[1], 2)  # G
-        dst.write(rgb8[2], 3)  # B
+        dst.write(rgb8)  # [3,H,W] -> band 1/2/3 = R/G/B
 
 
-def save_rgb_png(out_png: Path, rgb01: np.ndarray) -> None:
-    """Save RGB PNG using rasterio (no PIL dependency)."""
+def save_rgb_png(out_png: Path, rgb8: np.ndarray) -> None:
+    """
+    Save RGB PNG (no PIL dependency). rgb8: uint8 [3,H,W] (또는 float32 [0,1]).
+    imagecodecs가 있으면 (H,W,3) 8-bit RGB로 바로 encode, 없으면 rasterio PNG driver.
+    """
     out_png.parent.mkdir(parents=True, exist_ok=True)
-    rgb8 = (np.clip(rgb01, 0, 1) * 255.0 + 0.5).astype(np.uint8)
+    if rgb8.dtype != np.uint8:
+        rgb8 = to_uint8(rgb8)
+    if HAVE_IMAGECODECS:
+        hwc = np.ascontiguousarray(np.moveaxis(rgb8, 0, -1))
+        out_png.write_bytes(imagecodecs.png_encode(hwc, level=6))
+        return
+
     profile = {
         "driver": "PNG",
         "height": rgb8.shape[1],
@@ -109,9 +398,40 @@ def save_rgb_png(out_png: Path, rgb01: np.ndarray) -> None:
         "dtype": "uint8",
     }
     with rasterio.open(out_png, "w", **profile) as dst:
-        dst.write(rgb8[0], 1)
-        dst.write(rgb8[1], 2)
-        dst.write(rgb8[2], 3)
+        dst.write(rgb8)
+
+
+def _png_chunk(f, tag: bytes, data: bytes) -> None:
+    f.write(struct.pack(">I", len(data)) + tag)
+    f.write(data)
+    f.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(tag))))
+
+
+def save_rgb_png_from_geotiff(out_png: Path, src_tif: Path) -> None:
+    """
+    uint8 RGB GeoTIFF -> 8-bit RGB PNG를 STRIP_ROWS 행 단위로 encode (SUB filter + zlib level 6).
+    imagecodecs.png_encode는 (H,W,3) 전체를 한 번에 받아야 해서, 여기서는 IDAT zlib 스트림을 직접 이어 씀
+    -> 최대 메모리는 strip 하나 분량.
+    """
+    out_png.parent.mkdir(parents=True, exist_ok=True)
+    with rasterio.Env(**GDAL_ENV), rasterio.open(src_tif) as src, open(out_png, "wb") as f:
+        h, w = src.height, src.width
+        f.write(b"\x89PNG\r\n\x1a\n")
+        _png_chunk(f, b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0))  # 8-bit RGB
+        z = zlib.compressobj(6)
+        for y0 in range(0, h, STRIP_ROWS):
+            rows = min(STRIP_ROWS, h - y0)
+            hwc = np.moveaxis(src.read([1, 2, 3], window=Window(0, y0, w, rows)), 0, -1).reshape(rows, w * 3)
+            # 각 행 = filter byte(1=SUB) + 왼쪽 픽셀과의 차이 (uint8 wrap-around)
+            buf = np.empty((rows, w * 3 + 1), dtype=np.uint8)
+            buf[:, 0] = 1
+            buf[:, 1:4] = hwc[:, :3]
+            np.subtract(hwc[:, 3:], hwc[:, :-3], out=buf[:, 4:])
+            data = z.compress(buf)
+            if data:
+                _png_chunk(f, b"IDAT", data)
+        _png_chunk(f, b"IDAT", z.flush())
+        _png_chunk(f, b"IEND", b"")
 
 
 def save_tci_png(out_png: Path, tci_jp2: Path, aoi_bounds=None, aoi_bounds_crs="EPSG:4326") -> None:
@@ -120,56 +440,210 @@ def save_tci_png(out_png: Path, tci_jp2: Path, aoi_bounds=None, aoi_bounds_crs="
     여기서는 앞의 3밴드를 RGB로 저장합니다.
     """
     out_png.parent.mkdir(parents=True, exist_ok=True)
-    with rasterio.open(tci_jp2) as src:
-        if aoi_bounds is None:
-            arr = src.read()  # [count,H,W]
-        else:
-            from rasterio.warp import transform_bounds
-            b = transform_bounds(aoi_bounds_crs, src.crs, *aoi_bounds, densify_pts=21)
-            win = from_bounds(*b, transform=src.transform)
-            win = win.round_offsets().round_lengths()
-            win = win.intersection(rasterio.windows.Window(0, 0, src.width, src.height))
-            arr = src.read(window=win)
-
-    if arr.shape[0] < 3:
-        raise RuntimeError(f"TCI has <3 bands: {tci_jp2}")
-
-    rgb = arr[:3].astype(np.float32)
-
-    # TCI는 이미 시각화용이어서 보통 0-255/0-10000 등 케이스가 있음 -> 퍼센타일 스트레치로 안전하게
-    r = percentile_stretch(rgb[0])
-    g = percentile_stretch(rgb[1])
-    b = percentile_stretch(rgb[2])
-    rgb01 = np.stack([r, g, b], axis=0)
+    with rasterio.Env(**GDAL_ENV), rasterio.open(tci_jp2) as src:
+        if src.count < 3:
+            raise RuntimeError(f"TCI has <3 bands: {tci_jp2}")
+        win = None if aoi_bounds is None else _aoi_window(src, aoi_bounds, aoi_bounds_crs)
+        rgb = src.read([1, 2, 3], window=win)  # [3,H,W], 4번째 밴드는 decode하지 않음
+
+    # S2 TCI는 보통 이미 화면용 uint8 -> 스트레치 없이 그대로 저장
+    if rgb.dtype == np.uint8:
+        save_rgb_png(out_png, rgb)
+        return
+
+    # 예전 형식(uint16 등) TCI만 퍼센타일 스트레치로 안전하게
+    rgb8 = np.empty(rgb.shape, dtype=np.uint8)
+    for c in range(3):
+        stretch_to_uint8(rgb[c], out=rgb8[c])
+
+    save_rgb_png(out_png, rgb8)
+
+
+# --- GPU backend (nvJPEG2000 via nvImageCodec) ---
+
+@lru_cache(maxsize=1)
+def _gpu_available() -> bool:
+    if not HAVE_NVJPEG2K:
+        return False
+    try:
+        return cp.cuda.runtime.getDeviceCount() > 0
+    except cp.cuda.runtime.CUDARuntimeError:
+        return False
+
+
+def _use_gpu(backend: str | None, aoi_bounds=None) -> bool:
+    if (backend or JP2_BACKEND).lower() != "nvjpeg2k":
+        return False
+    if aoi_bounds is not None:
+        # nvJPEG2000 경로는 타일 전체 decode -> AOI window만 읽는 CPU 경로가 더 적게 일함
+        _warn_gpu_skipped("AOI crop 지정됨")
+        return False
+    if not _gpu_available():
+        _warn_gpu_skipped("cupy/nvImageCodec/CUDA 없음")
+        return False
+    return True
+
+
+@lru_cache(maxsize=None)
+def _warn_gpu_skipped(reason: str) -> None:
+    print(f"  ⚠️ nvjpeg2k backend 사용 안 함 ({reason}) -> CPU decode")
+
+
+@lru_cache(maxsize=1)
+def _gpu_decoder():
+    return nvimgcodec.Decoder()
+
+
+if HAVE_NVJPEG2K:
+    # percentile stretch -> gamma -> uint8 을 GPU에서 한 번에
+    _STRETCH_GAMMA_U8_GPU = cp.ElementwiseKernel(
+        "T x, float32 lo, float32 scale, float32 inv_gamma",
+        "uint8 y",
+        """
+        float v = ((float)x - lo) * scale;
+        v = fminf(fmaxf(v, 0.0f), 1.0f);
+        if (inv_gamma != 1.0f) v = powf(v, inv_gamma);
+        y = (unsigned char)(v * 255.0f + 0.5f);
+        """,
+        "s2_stretch_gamma_u8",
+    )
+
+
+def _read_bands_gpu(paths):
+    """
+    여러 JP2(타일 전체)를 nvJPEG2000으로 한 번의 batch decode (GPU에서 밴드 간 병렬).
+    좌표 정보(transform/crs)는 rasterio로 header만 읽어서 확인.
+    Returns ([cupy 2D 배열, ...], transform, crs)
+    """
+    with ExitStack() as stack:
+        _, _, transform, crs = _open_bands(stack, paths)
+
+    params = nvimgcodec.DecodeParams(color_spec=nvimgcodec.ColorSpec.UNCHANGED, allow_any_depth=True)
+    images = _gpu_decoder().decode([Path(p).read_bytes() for p in paths], params=params)
+
+    bands = []
+    for p, img in zip(paths, images):
+        if img is None:
+            raise RuntimeError(f"nvjpeg2k decode failed: {p}")
+        arr = cp.asarray(img)
+        bands.append(arr[..., 0] if arr.ndim == 3 else arr)
+    return bands, transform, crs
+
+
+def _stretch_to_uint8_gpu(x, p_low=2.0, p_high=98.0, gamma=1.0, out=None):
+    """stretch_to_uint8의 GPU 버전 (x: cupy uint8/uint16). 퍼센타일은 GPU 히스토그램으로."""
+    if out is None:
+        out = cp.empty(x.shape, dtype=cp.uint8)
+    hist = cp.bincount(x.ravel(), minlength=np.iinfo(x.dtype).max + 1)
+    lo, hi, vmin, vmax = _percentile_from_hist(cp.asnumpy(hist), p_low, p_high)
+    if hi <= lo:
+        lo, hi = vmin, vmax
+    if hi <= lo:
+        out[...] = 0
+        return out
+    inv_gamma = 1.0 if gamma is None or gamma == 1.0 else 1.0 / float(gamma)
+    _STRETCH_GAMMA_U8_GPU(x, np.float32(lo), np.float32(1.0 / (hi - lo)), np.float32(inv_gamma), out)
+    return out
+
+
+def _make_rgb_from_bands_gpu(
+    b04_path: Path, b03_path: Path, b02_path: Path,
+    p_low=2.0, p_high=98.0, gamma=1.0,
+) -> tuple[np.ndarray, Affine, rasterio.crs.CRS]:
+    """
+    Sentinel-2 TrueColor 합성 규칙:
+      R = B04, G = B03, B = B02
+    Return (rgb8 uint8 [3,H,W], transform, crs).
 
-    save_rgb_png(out_png, rgb01)
+    nvJPEG2000으로 타일 전체를 decode + stretch/gamma/uint8을 GPU에서 하고 uint8 결과만 가져옴.
+    AOI crop은 지원하지 않음 (_use_gpu가 CPU로 돌림).
+    CPU 경로는 save_rgb_geotiff_from_bands (strip 스트리밍, 전체 배열을 만들지 않음).
+    """
+    bands, transform, crs = _read_bands_gpu([b04_path, b03_path, b02_path])
+    rgb8 = cp.empty((3,) + bands[0].shape, dtype=cp.uint8)
+    for c, band in enumerate(bands):
+        _stretch_to_uint8_gpu(band, p_low, p_high, gamma, out=rgb8[c])
+    return cp.asnumpy(rgb8), transform, crs
 
 
 def make_rgb_from_bands(
     b04_path: Path, b03_path: Path, b02_path: Path,
     aoi_bounds=None, aoi_bounds_crs="EPSG:4326",
-    p_low=2.0, p_high=98.0, gamma=1.0
+    p_low=2.0, p_high=98.0, gamma=1.0,
+    backend: str | None = None,
 ) -> tuple[np.ndarray, Affine, rasterio.crs.CRS]:
     """
     Sentinel-2 TrueColor 합성 규칙:
       R = B04, G = B03, B = B02
+    Return (rgb8 uint8 [3,H,W], transform, crs) — 전체 배열을 메모리에 만듦.
+    (GeoTIFF로 바로 쓸 거면 strip 스트리밍인 save_rgb_geotiff_from_bands가 메모리를 덜 씀)
+
+    세 밴드는 한 번씩만 열고(AOI window도 한 번 계산), decode는 스레드로 동시에 수행 (GDAL read는 GIL 해제).
+    backend="nvjpeg2k"(기본은 JP2_BACKEND)이고 AOI가 없으면 _make_rgb_from_bands_gpu로 처리.
     """
-    b04, transform, crs = read_one_band(b04_path, aoi_bounds, aoi_bounds_crs)
-    b03, transform2, crs2 = read_one_band(b03_path, aoi_bounds, aoi_bounds_crs)
-    b02, transform3, crs3 = read_one_band(b02_path, aoi_bounds, aoi_bounds_crs)
+    if _use_gpu(backend, aoi_bounds):
+        return _make_rgb_from_bands_gpu(b04_path, b03_path, b02_path, p_low=p_low, p_high=p_high, gamma=gamma)
 
-    # sanity (대부분 동일해야 함)
-    if crs != crs2 or crs != crs3:
-        raise RuntimeError("CRS mismatch among bands.")
-    if transform != transform2 or transform != transform3 or b04.shape != b03.shape or b04.shape != b02.shape:
-        raise RuntimeError("Band grids mismatch (shape/transform). Crop bounds must be consistent.")
+    with ExitStack() as stack:
+        srcs, win, transform, crs = _open_bands(stack, [b04_path, b03_path, b02_path], aoi_bounds, aoi_bounds_crs)
+        with ThreadPoolExecutor(max_workers=3) as ex:
+            bands = list(ex.map(_read_window, srcs, [win] * 3))
 
-    r = apply_gamma(percentile_stretch(b04, p_low, p_high), gamma)
-    g = apply_gamma(percentile_stretch(b03, p_low, p_high), gamma)
-    b = apply_gamma(percentile_stretch(b02, p_low, p_high), gamma)
+    # stretch + gamma + uint8 양자화를 밴드별로 한 번에 (결과 uint8 배열에 바로 기록)
+    rgb8 = np.empty((3,) + bands[0].shape, dtype=np.uint8)
+    for c, band in enumerate(bands):
+        apply_stretch_uint8(band, _stretch_limits(band, p_low, p_high), gamma, out=rgb8[c])
+    return rgb8, transform, crs
 
-    rgb01 = np.stack([r, g, b], axis=0).astype(np.float32)
-    return rgb01, transform, crs
+
+def _band_limits(src, win: Window, p_low: float, p_high: float) -> tuple[float, float] | None:
+    """window 영역을 축소 읽기(JP2 reduced resolution)해서 stretch (lo, hi) 추정."""
+    f = max(1, math.ceil(max(win.height, win.width) / STATS_MAX_DIM))
+    small_hw = (max(1, int(win.height) // f), max(1, int(win.width) // f))
+    with rasterio.Env(**GDAL_ENV):
+        small = src.read(1, window=win, out_shape=small_hw, resampling=Resampling.nearest)
+    return _stretch_limits(small, p_low, p_high)
+
+
+def save_rgb_geotiff_from_bands(
+    out_tif: Path,
+    b04_path: Path, b03_path: Path, b02_path: Path,
+    aoi_bounds=None, aoi_bounds_crs="EPSG:4326",
+    p_low=2.0, p_high=98.0, gamma=1.0
+) -> None:
+    """
+    B04/B03/B02 -> RGB uint8 GeoTIFF를 STRIP_ROWS 행 단위로 스트리밍 기록.
+    전체 밴드/RGB 배열을 만들지 않으므로 최대 메모리는 strip 하나 분량.
+    stretch (lo, hi)는 밴드별 축소 읽기에서 미리 한 번만 계산.
+    """
+    out_tif.parent.mkdir(parents=True, exist_ok=True)
+    with ExitStack() as stack:
+        srcs, win, transform, crs = _open_bands(stack, [b04_path, b03_path, b02_path], aoi_bounds, aoi_bounds_crs)
+
+        h, w = int(win.height), int(win.width)
+        ex = stack.enter_context(ThreadPoolExecutor(max_workers=3))
+        limits = list(ex.map(_band_limits, srcs, [win] * 3, [p_low] * 3, [p_high] * 3))
+
+        profile = _rgb_geotiff_profile(h, w, transform, crs)
+        with rasterio.open(out_tif, "w", **profile) as dst:
+            for y0 in range(0, h, STRIP_ROWS):
+                rows = min(STRIP_ROWS, h - y0)
+                strip = Window(win.col_off, win.row_off + y0, w, rows)
+                bands = list(ex.map(_read_window, srcs, [strip] * 3))
+                rgb8 = np.empty((3, rows, w), dtype=np.uint8)
+                for c in range(3):
+                    apply_stretch_uint8(bands[c], limits[c], gamma, out=rgb8[c])
+                dst.write(rgb8, window=Window(0, y0, w, rows))
+
+
+def _list_subdirs(root: Path) -> list[Path]:
+    """root 바로 아래 디렉터리 목록 (이름순). os.scandir의 d_type을 써서 항목별 stat을 피함."""
+    try:
+        with os.scandir(root) as it:
+            names = sorted(e.name for e in it if e.is_dir())
+    except FileNotFoundError:
+        return []
+    return [root / n for n in names]
 
 
 def main():
@@ -190,15 +664,13 @@ def main():
     gamma = 1.0  # 0.8 정도면 더 밝아짐
 
     # dl_root 구조: S2_TOPK_JP2/<sensor>/<item_id>/<files...>
-    for sensor_dir in sorted(dl_root.glob("*")):
-        if not sensor_dir.is_dir():
-            continue
+    for sensor_dir in _list_subdirs(dl_root):
         sensor = sensor_dir.name
 
-        for item_dir in sorted(sensor_dir.glob("*")):
-            if not item_dir.is_dir():
-                continue
+        for item_dir in _list_subdirs(sensor_dir):
             item_id = item_dir.name
+            # 입력 jp2 존재 여부는 item당 한 번 읽은 목록으로 판정
+            item_files = set(os.listdir(item_dir))
 
             # 기대 파일명(다운로더가 item_id_key.jp2로 저장했음)
             tci = item_dir / f"{item_id}_TCI_10m.jp2"
@@ -212,7 +684,7 @@ def main():
             print(f"\n[{sensor}] {item_id}")
 
             # (1) TCI → PNG
-            if tci.exists():
+            if tci.name in item_files:
                 out_png = out_dir / f"{item_id}_TCI_10m.png"
                 if out_png.exists():
                     print("  - TCI png: exists")
@@ -224,7 +696,7 @@ def main():
                 print("  - TCI jp2 missing")
 
             # (2) Bands → RGB 합성 → GeoTIFF + PNG
-            if b02.exists() and b03.exists() and b04.exists():
+            if {b02.name, b03.name, b04.name} <= item_files:
                 out_tif = out_dir / f"{item_id}_RGB_from_B02B03B04_10m.tif"
                 out_png = out_dir / f"{item_id}_RGB_from_B02B03B04_10m.png"
 
@@ -232,15 +704,26 @@ def main():
                     print("  - RGB(tif/png): exists")
                 else:
                     print("  - RGB 합성: writing...")
-                    rgb01, transform, crs = make_rgb_from_bands(
-                        b04, b03, b02,
-                        aoi_bounds=aoi_bounds,
-                        p_low=p_low, p_high=p_high, gamma=gamma
-                    )
-                    save_rgb_geotiff(out_tif, rgb01, transform, crs)
-                    save_rgb_png(out_png, rgb01)
-                    print("    saved ->", out_tif)
-                    print("    saved ->", out_png)
+                    if not out_tif.exists() and _use_gpu(None, aoi_bounds):
+                        # GPU backend(opt-in, AOI 없을 때만): 세 밴드를 GPU에서 decode/합성한 uint8 결과로 기록
+                        rgb8, transform, crs = make_rgb_from_bands(
+                            b04, b03, b02,
+                            p_low=p_low, p_high=p_high, gamma=gamma
+                        )
+                        save_rgb_geotiff(out_tif, rgb8, transform, crs)
+                        print("    saved ->", out_tif)
+                    elif not out_tif.exists():
+                        # GeoTIFF는 strip 단위 스트리밍 (전체 배열을 메모리에 올리지 않음)
+                        save_rgb_geotiff_from_bands(
+                            out_tif, b04, b03, b02,
+                            aoi_bounds=aoi_bounds,
+                            p_low=p_low, p_high=p_high, gamma=gamma
+                        )
+                        print("    saved ->", out_tif)
+                    if not out_png.exists():
+                        # PNG는 방금 만든 uint8 GeoTIFF에서 행 단위로 변환 (전체 래스터를 읽지 않음)
+                        save_rgb_png_from_geotiff(out_png, out_tif)
+                        print("    saved ->", out_png)
             else:
                 print("  - B02/B03/B04 jp2 missing (skip RGB compositing)")
 
@@ -2,16 +2,46 @@ from __future__ import annotations
 
 import json
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from urllib.parse import urlparse
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
 from dotenv import load_dotenv
 
+try:
+    import orjson
+    HAVE_ORJSON = True
+except ImportError:  # orjson은 선택 사항 -> 표준 json으로 동작
+    HAVE_ORJSON = False
+
 
 EODATA_ENDPOINT = "https://eodata.dataspace.copernicus.eu"
 
+# asset 단위 병렬 다운로드 + 파일마다 16 MiB part 16개까지 동시 전송
+DOWNLOAD_WORKERS = 8
+TRANSFER_CONFIG = TransferConfig(
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=16,
+    use_threads=True,
+)
+# 20m/60m asset(SCL, B11 등)은 작아서 TransferManager 없이 GetObject 한 번으로 받음
+# (크기를 알려고 HEAD를 보내면 RTT가 하나 더 들기 때문에 key 이름으로 판단)
+SMALL_ASSET_SUFFIXES = ("_20m.jp2", "_60m.jp2")
+COPY_CHUNK = 1024 * 1024
+
+# 공유 client 하나의 연결 풀 (DOWNLOAD_WORKERS x part 동시 전송을 감당하도록)
+S3_MAX_POOL_CONNECTIONS = 64
+
+
+def load_manifest(path: Path) -> dict:
+    if HAVE_ORJSON:
+        return orjson.loads(path.read_bytes())
+    return json.loads(path.read_text(encoding="utf-8"))
+
 
 def parse_s3_href(href: str) -> tuple[str, str]:
     """
@@ -33,7 +63,30 @@ def ensure_download(s3, href: str, out_path: Path) -> None:
     if out_path.exists() and out_path.stat().st_size > 0:
         return
 
-    s3.download_file(bucket, key, str(out_path))
+    if key.lower().endswith(SMALL_ASSET_SUFFIXES):
+        tmp_path = out_path.with_suffix(out_path.suffix + ".part")
+        resp = s3.get_object(Bucket=bucket, Key=key)
+        with open(tmp_path, "wb") as f:
+            shutil.copyfileobj(resp["Body"], f, COPY_CHUNK)
+        tmp_path.replace(out_path)
+        return
+
+    s3.download_file(bucket, key, str(out_path), Config=TRANSFER_CONFIG)
+
+
+def download_all(s3, jobs: list[tuple[str, Path]], max_workers: int = DOWNLOAD_WORKERS) -> None:
+    """
+    jobs: [(href, out_path), ...] 를 스레드풀로 동시에 받습니다.
+    (boto3 client는 download_file 호출에 대해 thread-safe이므로 하나를 공유)
+    """
+    if not jobs:
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        futs = {ex.submit(ensure_download, s3, href, p): p for href, p in jobs}
+        for fut in as_completed(futs):
+            fut.result()  # 실패 시 예외를 그대로 올림
+            print(f"  saved -> {futs[fut]}")
 
 
 def main() -> None:
@@ -47,7 +100,7 @@ def main() -> None:
         aws_access_key_id=access_key,
         aws_secret_access_key=secret_key,
         endpoint_url=EODATA_ENDPOINT,
-        config=Config(signature_version="s3v4"),
+        config=Config(signature_version="s3v4", max_pool_connections=S3_MAX_POOL_CONNECTIONS),
     )
 
     manifest_path = Path(r".\downloads") / "s2_stac_picks_manifest.json"
@@ -58,7 +111,10 @@ def main() -> None:
     dl_root = out_root / "S2_TOPK_JP2"
     dl_root.mkdir(parents=True, exist_ok=True)
 
-    data = json.loads(manifest_path.read_text(encoding="utf-8"))
+    data = load_manifest(manifest_path)
+
+    # manifest를 먼저 훑어서 받을 파일 목록을 만들고, 한꺼번에 병렬 다운로드
+    jobs: list[tuple[str, Path]] = []
 
     for t in data.get("targets", []):
         sensor = t.get("sensor", "UNKNOWN")
@@ -110,9 +166,8 @@ def main() -> None:
                 if out_path.exists() and out_path.stat().st_size > 0:
                     print(f"      - {keyname}: exists")
                 else:
-                    print(f"      - {keyname}: downloading...")
-                    ensure_download(s3, href, out_path)
-                    print(f"        saved -> {out_path}")
+                    print(f"      - {keyname}: queued")
+                    jobs.append((href, out_path))
             else:
                 print("      - TCI: 없음(스킵)")
 
@@ -130,9 +185,8 @@ def main() -> None:
                     if out_path.exists() and out_path.stat().st_size > 0:
                         print(f"      - {band_key}: exists")
                     else:
-                        print(f"      - {band_key}: downloading...")
-                        ensure_download(s3, href, out_path)
-                        print(f"        saved -> {out_path}")
+                        print(f"      - {band_key}: queued")
+                        jobs.append((href, out_path))
             else:
                 print("      - BANDS: 없음(스킵)")
         
@@ -152,12 +206,14 @@ def main() -> None:
                     if out_path.exists() and out_path.stat().st_size > 0:
                         print(f"      - {keyname}: exists")
                     else:
-                        print(f"      - {keyname}: downloading...")
-                        ensure_download(s3, href, out_path)
-                        print(f"        saved -> {out_path}")
+                        print(f"      - {keyname}: queued")
+                        jobs.append((href, out_path))
             else:
                 print("      - index_extra(B08/B11/SCL): 없음(스킵)")
 
+    print(f"\n=== downloading {len(jobs)} files ({DOWNLOAD_WORKERS} workers) ===")
+    download_all(s3, jobs)
+
     print("\n✅ Download done.")
     print(f"📁 JP2 root: {dl_root}")
 
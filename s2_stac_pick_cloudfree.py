@@ -2,13 +2,19 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
+import itertools
 import json
 import pystac_client
 
-import rasterio
+try:
+    import orjson
+    HAVE_ORJSON = True
+except ImportError:  # orjson은 선택 사항 -> 표준 json으로 동작
+    HAVE_ORJSON = False
 
 STAC_URL = "https://stac.dataspace.copernicus.eu/v1"
 
@@ -23,6 +29,20 @@ class PickConfig:
     prefer_same_orbit: bool = False  # placeholder (S2 orbit constraints usually not needed for figure background)
 
 
+def load_manifest(path: Path) -> Dict[str, Any]:
+    if HAVE_ORJSON:
+        return orjson.loads(path.read_bytes())
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def save_manifest(path: Path, obj: Dict[str, Any]) -> None:
+    if HAVE_ORJSON:
+        path.write_bytes(orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+    else:
+        path.write_text(json.dumps(obj, indent=2), encoding="utf-8")
+
+
+@lru_cache(maxsize=4096)
 def _to_dt_utc(s: str) -> datetime:
     # STAC datetime is ISO8601 like "2021-01-27T02:19:49.024Z"
     # Convert 'Z' to +00:00 for fromisoformat
@@ -31,9 +51,9 @@ def _to_dt_utc(s: str) -> datetime:
     return datetime.fromisoformat(s).astimezone(timezone.utc)
 
 
-def _safe_get_cloud(item) -> float:
+def _safe_get_cloud(item: Dict[str, Any]) -> float:
     # eo:cloud_cover is usually present in properties for S2
-    v = item.properties.get("eo:cloud_cover", None)
+    v = item["properties"].get("eo:cloud_cover", None)
     if v is None:
         return float("inf")
     try:
@@ -42,66 +62,82 @@ def _safe_get_cloud(item) -> float:
         return float("inf")
 
 
-def _score_item(item, target_dt: datetime) -> Tuple[float, float, datetime]:
+def _get_epsg(props: Dict[str, Any]) -> Optional[int]:
+    # projection extension v2부터는 proj:epsg 대신 proj:code("EPSG:32652")
+    epsg = props.get("proj:epsg")
+    if epsg is None:
+        code = props.get("proj:code")
+        # "EPSG:<숫자>"가 아닌 값(WKT/PROJJSON, 다른 authority 등)은 None
+        if isinstance(code, str) and code[:5].upper() == "EPSG:":
+            tail = code[5:].strip()
+            if tail.isdigit():
+                epsg = int(tail)
+    return epsg
+
+
+def _score_item(item: Dict[str, Any], target_epoch: float) -> Tuple[float, float, float]:
     """
     Sort key:
       1) cloud cover (ascending)
       2) |time difference| in hours (ascending)
-      3) acquisition datetime (ascending) as stable tie-breaker
+      3) acquisition time (epoch seconds, ascending) as stable tie-breaker
+    target_epoch = target_dt.timestamp() (호출 측에서 한 번만 계산)
     """
     cloud = _safe_get_cloud(item)
-    dt = _to_dt_utc(item.properties["datetime"])
-    dt_diff_hours = abs((dt - target_dt).total_seconds()) / 3600.0
-    return (cloud, dt_diff_hours, dt)
-
-def pick_s2_tci_asset(item):
-    a = (item.assets or {}).get("TCI_10m")
-    if a and getattr(a, "href", None):
-        return {"key": "TCI_10m", "href": a.href, "type": getattr(a, "media_type", None)}
-    return None
-
-def pick_s2_rgb_bands(item):
-
-    assets = item.assets or {}
-
-    def get(key):
-        a = assets.get(key)
-        if a and getattr(a, "href", None):
-            return {"key": key, "href": a.href, "type": getattr(a, "media_type", None)}
-        return None
-
-    out = {
-        "B02": get("B02_10m"),
-        "B03": get("B03_10m"),
-        "B04": get("B04_10m"),
+    t = _to_dt_utc(item["properties"]["datetime"]).timestamp()
+    dt_diff_hours = abs(t - target_epoch) / 3600.0
+    return (cloud, dt_diff_hours, t)
+
+# manifest에 담을 S2 asset key (TCI / RGB 10m / index용 B08, B11, SCL)
+S2_ASSET_KEYS = ("TCI_10m", "B02_10m", "B03_10m", "B04_10m", "B08_10m", "B11_20m", "SCL_20m")
+_S2_ASSET_SET = frozenset(S2_ASSET_KEYS)
+
+
+def _pick_s2_assets(assets: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """asset map을 한 번만 순회해서 필요한 key의 {"key", "href", "type"}만 추출."""
+    return {
+        k: {"key": k, "href": a["href"], "type": a.get("type")}
+        for k, a in assets.items()
+        if k in _S2_ASSET_SET and a and a.get("href")
     }
-    # 필수(10m) 없으면 None 처리
-    if not (out["B02"] and out["B03"] and out["B04"]):
-        return None
-    return out
 
 
-def pick_s2_index_assets(item):
-    assets = item.assets or {}
+def pick_s2_assets(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Return {"tci": ..., "bands": {B02,B03,B04} | None, "index": {B08,B11,SCL} | None}."""
+    got = _pick_s2_assets(item.get("assets") or {})
 
-    def get(key):
-        a = assets.get(key)
-        if a and getattr(a, "href", None):
-            return {"key": key, "href": a.href, "type": getattr(a, "media_type", None)}
-        return None
+    bands = {"B02": got.get("B02_10m"), "B03": got.get("B03_10m"), "B04": got.get("B04_10m")}
+    # 필수(10m) 없으면 None 처리
+    if not (bands["B02"] and bands["B03"] and bands["B04"]):
+        bands = None
 
-    out = {
-        "B08": get("B08_10m"),
-        "B11": get("B11_20m"),   # 20m
-        "SCL": get("SCL_20m"),   # 20m
+    index = {
+        "B08": got.get("B08_10m"),
+        "B11": got.get("B11_20m"),   # 20m
+        "SCL": got.get("SCL_20m"),   # 20m
     }
     # 필수(10m) 없으면 None 처리
-    if not out["B08"]:
-        return None
-    return out
+    if not index["B08"]:
+        index = None
+
+    return {"tci": got.get("TCI_10m"), "bands": bands, "index": index}
+
+
+def pick_s2_tci_asset(item: Dict[str, Any]):
+    return pick_s2_assets(item)["tci"]
+
+
+def pick_s2_rgb_bands(item: Dict[str, Any]):
+    return pick_s2_assets(item)["bands"]
+
+
+def pick_s2_index_assets(item: Dict[str, Any]):
+    return pick_s2_assets(item)["index"]
+
 
 def pick_topk_items(client, target_date: str, cfg: PickConfig, k: int = 3):
     target_dt = datetime.fromisoformat(target_date).replace(tzinfo=timezone.utc)
+    target_epoch = target_dt.timestamp()
 
     plan = [
         (cfg.window_days, cfg.cloud_lt),
@@ -124,39 +160,32 @@ def pick_topk_items(client, target_date: str, cfg: PickConfig, k: int = 3):
             limit=100,
         )
 
-        items = []
-        for it in search.items():
-            items.append(it)
-            if len(items) >= cfg.max_items:
-                break
+        # pystac.Item을 만들지 않고 raw dict로 받음 (정렬/asset 추출에는 dict로 충분)
+        items = list(itertools.islice(search.items_as_dicts(), cfg.max_items))
 
         if not items:
             last_reason = f"No items in ±{window_days} days with eo:cloud_cover < {cloud_lt}"
             continue
 
-        items_sorted = sorted(items, key=lambda x: _score_item(x, target_dt))
+        items_sorted = sorted(items, key=lambda x: _score_item(x, target_epoch))
 
-        print("ASSET KEYS:", sorted((items_sorted[0].assets or {}).keys()))
+        print("ASSET KEYS:", sorted((items_sorted[0].get("assets") or {}).keys()))
 
         # build top-k summary
         topk = []
         for it in items_sorted[:k]:
+            props = it["properties"]
             topk.append({
-                "id": it.id,
-                "datetime": it.properties.get("datetime"),
-                "eo:cloud_cover": it.properties.get("eo:cloud_cover"),
-                "proj:epsg": it.properties.get("proj:epsg"),
+                "id": it["id"],
+                "datetime": props.get("datetime"),
+                "eo:cloud_cover": props.get("eo:cloud_cover"),
+                "proj:epsg": _get_epsg(props),
             })
 
         # store BOTH TCI and RGB bands for each top-k item
         topk_rgb_assets = []
         for it in items_sorted[:k]:
-            topk_rgb_assets.append({
-                "id": it.id,
-                "tci": pick_s2_tci_asset(it),
-                "bands": pick_s2_rgb_bands(it),
-                "index": pick_s2_index_assets(it),   
-            })
+            topk_rgb_assets.append({"id": it["id"], **pick_s2_assets(it)})
 
         return {
             "target_date": target_date,
@@ -207,7 +236,7 @@ def main() -> None:
 
         print(res["candidates_topk_rgb_assets"][0])
 
-        # ✅ CRS 확인: 첫 번째 후보의 B04 href로 테스트 (없으면 스킵)
+        # ✅ CRS 확인: 원격 JP2를 열지 않고 STAC proj:epsg 사용 (href는 디버깅용으로 출력)
         entry0 = res["candidates_topk_rgb_assets"][0]
         tci0 = entry0.get("tci")      # {"key": "TCI_10m", "href": "..."} or None
         bands0 = entry0.get("bands")  # {"B02": {...}, "B03": {...}, "B04": {...}} or None
@@ -217,28 +246,15 @@ def main() -> None:
         if bands0:
             print("B04 href:", bands0["B04"]["href"])
 
-        if tci0 and tci0.get("href"):
-            href = tci0["href"]
-        elif bands0 and bands0.get("B04") and bands0["B04"].get("href"):
-            href = bands0["B04"]["href"]
-        else:
-            href = None
-
-        if href:
-            try:
-                with rasterio.open(href) as src:
-                    print(src.crs, src.crs.to_epsg())
-            except Exception as e:
-                print("⚠️ rasterio로 원격 href를 바로 열지 못함:", repr(e))
-                print("   -> 해결: 먼저 다운로드 후 local file로 rasterio.open()")
+        print("proj:epsg:", res["candidates_topk"][0]["proj:epsg"])
 
     # 결과를 manifest로 저장 (다음 단계: RGB 다운로드/합성에서 그대로 씀)
     out = Path(r".\downloads") / "s2_stac_picks_manifest.json"
     out.parent.mkdir(parents=True, exist_ok=True)
-    out.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    save_manifest(out, results)
     
     print(f"\n✅ Saved manifest: {out}")
-    data = json.loads(out.read_text(encoding="utf-8"))
+    data = load_manifest(out)
     assert len(data["targets"]) > 0, "Manifest targets is empty! Append failed?"
     print(f"Manifest targets count = {len(data['targets'])}")
 